@@ -0,0 +1,31 @@
+# app/api/deps.py
+
+import uuid
+
+from fastapi import Request, Response
+
+from app.services.memory import SESSION_TTL, is_valid_session_id
+
+SESSION_HEADER = "X-Session-Id"
+SESSION_COOKIE = "session_id"
+
+
+def set_session_cookie(response: Response, session_id: str):
+    """Вернуть клиенту session_id в заголовке и cookie"""
+    response.headers[SESSION_HEADER] = session_id
+    response.set_cookie(
+        SESSION_COOKIE,
+        session_id,
+        max_age=int(SESSION_TTL),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def get_session_id(request: Request, response: Response) -> str:
+    """Session id из заголовка X-Session-Id или cookie; новый, если нет"""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if not session_id or not is_valid_session_id(session_id):
+        session_id = uuid.uuid4().hex
+    set_session_cookie(response, session_id)
+    return session_id
@@ -0,0 +1,39 @@
+# app/api/routes/admin.py
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from app.core import tracing
+
+# /admin/* требует заголовок X-Admin-Token с этим значением; без токена
+# раздел выключен (trace'ы содержат id сессий и тексты ошибок)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+router = APIRouter()
+
+
+def _check_token(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/traces")
+def list_traces(
+    limit: int = Query(50, ge=1, le=1000),
+    trace_id: Optional[str] = None,
+    min_ms: float = Query(0, ge=0),
+    name: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """Последние trace'ы из буфера процесса (новые первыми).
+
+    min_ms — только медленные запросы, name — по имени корня,
+    например "POST /code/run".
+    """
+    _check_token(x_admin_token)
+    return tracing.traces(limit=limit, trace_id=trace_id, min_ms=min_ms, name=name)
@@ -1,10 +1,36 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from app.api.deps import get_session_id
+from app.api.sse import stream_turn
 from app.models.chat_request import ChatRequest
 from app.services.qwen_client import ask_qwen
 
 router = APIRouter()
 
+
 @router.post("/")
-async def chat_endpoint(req: ChatRequest):
-    answer = await ask_qwen(req.message, req.mode)
+async def chat_endpoint(req: ChatRequest, session_id: str = Depends(get_session_id)):
+    answer = await ask_qwen(req.message, req.mode, session_id=session_id)
     return {"answer": answer}
+
+
+@router.post("/stream")
+async def chat_stream_endpoint(req: ChatRequest, session_id: str = Depends(get_session_id)):
+    """Потоковый вариант /chat (SSE).
+
+    События:
+    - token — очередной фрагмент ответа модели ({"text": ...});
+    - task  — следующая задача для редактора, как только она известна
+              (task_id, description, template);
+    - done  — итог хода: answer, next_task, is_final (как в /chat);
+    - error — ход завершился ошибкой.
+    """
+
+    async def run(emit):
+        return await ask_qwen(
+            req.message, req.mode,
+            on_token=lambda text: emit("token", {"text": text}),
+            on_task=lambda task: emit("task", task),
+            session_id=session_id,
+        )
+
+    return stream_turn(run, session_id)
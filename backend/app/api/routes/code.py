@@ -1,10 +1,15 @@
 # app/api/routes/code.py
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from app.api.deps import get_session_id
+from app.api.sse import stream_turn
 from app.services.sandbox import run_in_sandbox
+from app.services.sandbox_cache import sandbox_cache
+from app.services.sandbox_scheduler import SandboxBusy, scheduler
+from app.services import prefetch
 from app.services.qwen_client import ask_qwen
-from app.services.memory import memory  # ← ПРАВИЛЬНЫЙ ИМПОРТ
+from app.services.memory import sessions
 
 router = APIRouter()
 
@@ -12,14 +17,51 @@ class CodeRequest(BaseModel):
     code: str
     task_id: str
 
+
+async def _run_tests(req: CodeRequest, session_id: str) -> dict:
+    """Прогон кода в sandbox; сессия переходит на стадию feedback"""
+    memory = sessions.get(session_id)
+    if memory.stage in ("coding", "feedback"):
+        # следующая задача готовится, пока идут тесты
+        prefetch.start(session_id, memory)
+
+    try:
+        # повторный запуск того же кода берётся из кэша без процесса
+        sandbox_result = await sandbox_cache.run(
+            req.code,
+            req.task_id,
+            lambda: scheduler.run(session_id, run_in_sandbox, req.code, req.task_id),
+        )
+    except SandboxBusy as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Песочница перегружена, попробуйте позже",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    memory.stage = "feedback"
+    return sandbox_result
+
+
+def _test_report(sandbox_result: dict) -> dict:
+    return {
+        "success": sandbox_result["success"],
+        "results": sandbox_result["results"],
+        "tests": sandbox_result.get("tests", []),
+        "stdout": sandbox_result.get("stdout", ""),
+        "stderr": sandbox_result.get("stderr", ""),
+        "complexity": sandbox_result.get("complexity"),
+    }
+
+
 @router.post("/run")
-async def run_code(req: CodeRequest):
+async def run_code(req: CodeRequest, session_id: str = Depends(get_session_id)):
     """Запускает код в sandbox и возвращает feedback"""
-    
-    sandbox_result = run_in_sandbox(req.code, req.task_id)
-    memory.stage = "feedback"
-    feedback_response = await ask_qwen("", "TECH", code_result=sandbox_result)
-    
+    sandbox_result = await _run_tests(req, session_id)
+    feedback_response = await ask_qwen(
+        "", "TECH", code_result=sandbox_result, session_id=session_id
+    )
+
     if isinstance(feedback_response, dict):
         llm_feedback = feedback_response.get("answer", "")
         next_task = feedback_response.get("next_task")
@@ -28,11 +70,43 @@ async def run_code(req: CodeRequest):
         llm_feedback = str(feedback_response) if feedback_response else ""
         next_task = None
         is_final = False
-    
+
     return {
-        "success": sandbox_result["success"],
-        "results": sandbox_result["results"],
+        **_test_report(sandbox_result),
         "llm_feedback": llm_feedback,
         "next_task": next_task,
         "is_final": is_final
     }
+
+
+@router.post("/run/stream")
+async def run_code_stream(req: CodeRequest, session_id: str = Depends(get_session_id)):
+    """Потоковый вариант /code/run (SSE).
+
+    События:
+    - result — результаты тестов (success, results, tests, stdout, stderr,
+               complexity), сразу после прогона;
+    - token  — очередной фрагмент разбора;
+    - task   — следующая задача для редактора, как только она известна;
+    - done   — итог: answer, next_task, is_final;
+    - error  — ход завершился ошибкой.
+    """
+    # песочница до начала потока: при перегрузке клиент получает обычный 429
+    sandbox_result = await _run_tests(req, session_id)
+
+    async def run(emit):
+        emit("result", _test_report(sandbox_result))
+        return await ask_qwen(
+            "", "TECH", code_result=sandbox_result,
+            on_token=lambda text: emit("token", {"text": text}),
+            on_task=lambda task: emit("task", task),
+            session_id=session_id,
+        )
+
+    return stream_turn(run, session_id)
+
+
+@router.get("/queue")
+def queue_stats():
+    """Загрузка песочницы: сколько запусков выполняется и ждёт"""
+    return scheduler.stats()
@@ -1,15 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from pydantic import BaseModel
+from app.api.deps import get_session_id
+from app.services.memory import sessions
 
 router = APIRouter()
 
 class ModeRequest(BaseModel):
     mode: str
 
-current_mode = "HR"
-
 @router.post("/")
-def set_mode(req: ModeRequest):
-    global current_mode
-    current_mode = req.mode
-    return {"mode_set_to": current_mode}
+def set_mode(req: ModeRequest, session_id: str = Depends(get_session_id)):
+    memory = sessions.get(session_id)
+    memory.mode = req.mode
+    sessions.save(session_id, memory)
+    return {"mode_set_to": memory.mode}
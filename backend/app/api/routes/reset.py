@@ -1,9 +1,16 @@
-from fastapi import APIRouter
-from app.services.memory import memory
+from fastapi import APIRouter, Depends
+from app.api.deps import get_session_id
+from app.services import prefetch
+from app.services.memory import sessions
 
 router = APIRouter()
 
 @router.post("/")
-def reset_chat():
+async def reset_chat(session_id: str = Depends(get_session_id)):
+    # async: prefetch.discard отменяет asyncio-задачу, это можно делать
+    # только из потока event loop
+    memory = sessions.get(session_id)
+    prefetch.discard(session_id)
     memory.reset_full()
+    sessions.save(session_id, memory)
     return {"status": "ok"}
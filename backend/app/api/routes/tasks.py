@@ -1,20 +1,32 @@
-from fastapi import APIRouter, HTTPException
-from app.services.tasks import TASKS, get_task, random_task
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from app.api.deps import get_session_id
+from app.services.memory import sessions
+from app.services.tasks import bank, get_task, sample_task
 
 router = APIRouter()
 
 @router.get("/list")
-def list_tasks():
-    """Вернуть список всех задач"""
+def list_tasks(response: Response, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Вернуть страницу списка задач (всего — в заголовке X-Total-Count)"""
+    response.headers["X-Total-Count"] = str(len(bank))
     return [
-        {"task_id": tid, "title": data["title"], "description": data["description"]}
-        for tid, data in TASKS.items()
+        {"task_id": meta["task_id"], "title": meta["title"], "description": meta["description"]}
+        for meta in bank.page(offset, limit)
     ]
 
 @router.get("/random")
-def random_task_route():
-    """Вернуть случайную задачу"""
-    tid = random_task()
+def random_task_route(level: Optional[int] = None, session_id: str = Depends(get_session_id)):
+    """Вернуть случайную задачу (уровня level), которую сессия ещё не видела"""
+    memory = sessions.get(session_id)
+    tid = sample_task(level, exclude=memory.seen_tasks)
+    if tid is None:
+        raise HTTPException(status_code=404, detail="Unknown level")
+
+    memory.mark_task_seen(tid)
+    sessions.save(session_id, memory)
+
     task = get_task(tid)
     return {
         "task_id": tid,
@@ -0,0 +1,58 @@
+# app/api/sse.py
+#
+# Потоковые ответы (Server-Sent Events) для /chat/stream и /code/run/stream.
+
+import asyncio
+import json
+from typing import Awaitable, Callable
+
+from fastapi.responses import StreamingResponse
+
+from app.api.deps import set_session_cookie
+
+# emit(event, data) — отправить клиенту событие
+Emit = Callable[[str, object], None]
+
+
+def sse(event: str, data) -> str:
+    """Один кадр Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_turn(run: Callable[[Emit], Awaitable[object]], session_id: str) -> StreamingResponse:
+    """SSE-ответ на ход: run(emit) шлёт промежуточные события, его результат — событие done.
+
+    Ошибка хода — событие error. Если клиент отключился, ход отменяется.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: str, data):
+        queue.put_nowait((event, data))
+
+    async def run_turn():
+        try:
+            return await run(emit)
+        finally:
+            queue.put_nowait(None)
+
+    async def events():
+        turn = asyncio.create_task(run_turn())
+        try:
+            while (item := await queue.get()) is not None:
+                yield sse(*item)
+            yield sse("done", await turn)
+        except Exception as e:
+            yield sse("error", {"detail": str(e)})
+        finally:
+            # клиент отключился посреди ответа — генерацию дальше не ждём
+            if not turn.done():
+                turn.cancel()
+
+    response = StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # заголовки из зависимости не попадают в возвращённый напрямую Response
+    set_session_cookie(response, session_id)
+    return response
@@ -0,0 +1,107 @@
+# app/core/lru.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class LRUCache:
+    """Словарь ограниченного размера с вытеснением LRU и TTL.
+
+    ttl=None — записи живут, пока их не вытеснят по размеру.
+    sliding=True — TTL отсчитывается от последнего обращения (idle TTL),
+    иначе от момента записи; тогда и порядок — по записи: чтение запись не
+    продлевает и не освежает, по размеру вытесняется давнее записанное.
+    on_evict(key, value) вызывается для вытесненных и просроченных записей.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        sliding: bool = True,
+        on_evict: Optional[Callable] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sliding = sliding
+        self.on_evict = on_evict
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (value, stamp)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, stamp = item
+            now = self._clock()
+            if self.ttl is not None and now - stamp > self.ttl:
+                del self._data[key]
+                evicted = [(key, value)]
+                value = default
+            else:
+                evicted = []
+                if self.sliding:
+                    self._data.move_to_end(key)
+                    self._data[key] = (value, now)
+        self._notify(evicted)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            now = self._clock()
+            self._data[key] = (value, now)
+            self._data.move_to_end(key)
+            evicted = self._expire_locked(now)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._pop_oldest_locked())
+        self._notify(evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def expire(self) -> int:
+        """Удалить просроченные записи, вернуть их количество"""
+        with self._lock:
+            evicted = self._expire_locked(self._clock())
+        self._notify(evicted)
+        return len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _expire_locked(self, now: float) -> list:
+        # Порядок OrderedDict совпадает с порядком отметок времени (при
+        # sliding — обращений, иначе — записей), поэтому просроченные записи
+        # всегда в начале.
+        evicted = []
+        if self.ttl is None:
+            return evicted
+        while self._data:
+            key, (value, stamp) = next(iter(self._data.items()))
+            if now - stamp <= self.ttl:
+                break
+            evicted.append(self._pop_oldest_locked())
+        return evicted
+
+    def _pop_oldest_locked(self):
+        key, (value, _) = self._data.popitem(last=False)
+        return key, value
+
+    def _notify(self, evicted: list):
+        if self.on_evict is not None:
+            for key, value in evicted:
+                self.on_evict(key, value)
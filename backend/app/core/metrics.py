@@ -0,0 +1,226 @@
+# app/core/metrics.py
+#
+# Метрики процесса в текстовом формате Prometheus (GET /metrics).
+# Без внешних зависимостей: счётчики, гистограммы и gauge с метками.
+# Запись — поиск серии в словаре, bisect по границам корзин и сложение
+# под коротким lock (песочница пишет метрики из потоков пула).
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Optional
+
+# Границы корзин по умолчанию (сек): от миллисекунд до долгих ответов LLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # tuple значений меток -> значение
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            series = list(self._series.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in series]
+
+
+class Gauge(_Metric):
+    """Gauge; значение можно задать функцией — она вызывается при отдаче /metrics"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = (), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, doc, labelnames)
+        self.fn = fn
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def render(self) -> list:
+        if self.fn is not None:
+            return [f"{self.name} {_number(self.fn())}"]
+        with self._lock:
+            series = list(self._series.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in series]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # счётчики по корзинам (последняя — +Inf), сумма
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus 0.0.4"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.header())
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- метрики приложения ----------
+
+# Значения метки mode. Режим приходит от клиента как есть, поэтому всё, чего
+# нет в списке, пишется как "other" — иначе любой клиент мог бы заводить
+# новые серии без ограничений.
+LLM_MODES = ("TECH", "HR", "TRAINER", "STRUCTURED")
+
+
+def mode_label(mode: str) -> str:
+    """Режим интервью -> значение метки mode ("" — вызов вне хода интервью)"""
+    if not mode:
+        return ""
+    return mode if mode in LLM_MODES else "other"
+
+
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "Длительность запроса к LLM", ("mode", "stage", "outcome"),
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Токены запросов к LLM по данным usage", ("mode", "stage", "kind"),
+)
+LLM_CACHE_HITS = Counter(
+    "llm_cache_hits_total", "Ответы LLM, отданные из кэша", ("mode", "stage"),
+)
+LLM_RETRIES = Counter(
+    "llm_retries_total", "Повторы запросов к LLM после временных ошибок", ("stage",),
+)
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total", "Дублирующие запросы к LLM (hedging)", ("stage",),
+)
+LLM_FALLBACKS = Counter(
+    "llm_fallbacks_total", "Заготовленные ответы вместо недоступной LLM", ("stage",),
+)
+
+SANDBOX_RUN = Histogram(
+    "sandbox_run_duration_seconds", "Время прогона тестов в песочнице", ("task_id",),
+)
+SANDBOX_TIMEOUTS = Counter(
+    "sandbox_timeouts_total", "Прогоны, в которых тест превысил лимит времени", ("task_id",),
+)
+SANDBOX_QUEUE_WAIT = Histogram(
+    "sandbox_queue_wait_seconds", "Ожидание свободного слота песочницы",
+)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Длительность обработки HTTP-запроса", ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: длительность запросов по шаблону маршрута.
+
+    Шаблон (/tasks/{task_id}), а не фактический путь — чтобы число серий
+    не росло с числом разных URL. Для потоковых ответов меряется время до
+    конца тела.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route_template(scope),
+                status=status,
+            )
+
+
+def route_template(scope) -> str:
+    """Путь запроса с параметрами, заменёнными на {имя}: /tasks/two_sum -> /tasks/{task_id}"""
+    if "endpoint" not in scope:
+        return "unmatched"
+    segments = scope["path"].split("/")
+    for name, value in scope.get("path_params", {}).items():
+        value = str(value)
+        for i in range(len(segments) - 1, 0, -1):
+            if segments[i] == value:
+                segments[i] = "{" + name + "}"
+                break
+    return "/".join(segments)
@@ -0,0 +1,48 @@
+# app/core/tokens.py
+#
+# Подсчёт токенов для бюджетов промптов. Если установлен tiktoken —
+# точный счёт по cl100k_base (у Qwen свой словарь, но порядок величин
+# совпадает), иначе — эвристика по символам.
+
+import math
+import re
+
+try:
+    import tiktoken
+except ImportError:  # необязательная зависимость
+    tiktoken = None
+
+_encoding = None
+
+# Слова, числа, отдельные знаки — примерно как режет BPE
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def _heuristic(text: str) -> int:
+    # латиница — ~4 символа на токен, кириллица и прочее — ~2.5
+    total = 0
+    for piece in _PIECE_RE.findall(text):
+        ascii_chars = sum(1 for ch in piece if ch < "\x80")
+        total += max(1, math.ceil(ascii_chars / 4 + (len(piece) - ascii_chars) / 2.5))
+    return total
+
+
+def count_tokens(text: str) -> int:
+    """Число токенов в тексте"""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    return _heuristic(text)
+
+
+def count_message_tokens(messages: list) -> int:
+    """Токены в списке сообщений chat API (+4 на служебную разметку сообщения)"""
+    return sum(count_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+def backend() -> str:
+    return "tiktoken/cl100k_base" if tiktoken is not None else "heuristic"
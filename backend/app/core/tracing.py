@@ -0,0 +1,233 @@
+# app/core/tracing.py
+#
+# Трассировка хода интервью: у каждого HTTP-запроса свой trace id, внутри —
+# вложенные span'ы (обработчик маршрута, вызовы LLM, процессы песочницы,
+# итоговый отчёт). Текущий span живёт в contextvar, поэтому вложенность
+# сохраняется через await и create_task; в потоки контекст передаётся
+# явно (contextvars.copy_context, см. sandbox_scheduler).
+#
+# Завершённые span'ы копятся в кольцевом буфере (читается через
+# GET /admin/traces) и, если задан TRACE_FILE, пишутся JSON-строками в
+# ротируемый файл — из фонового потока, ход диска не ждёт.
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Optional
+
+from app.core.metrics import route_template
+
+# Сколько последних span'ов держать в памяти процесса
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "20000"))
+# Файл для span'ов (JSON Lines); пусто — только буфер в памяти
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 2**20)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+
+TRACE_HEADER = "X-Trace-Id"
+
+_TRACE_ID_RE = re.compile(r"^[0-9a-f]{16,32}$")
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_buffer = deque(maxlen=TRACE_BUFFER)
+_lock = threading.Lock()
+_file_logger: Optional[logging.Logger] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start", "_t0", "duration", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attrs: dict):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs):
+        """Дописать атрибуты span'а"""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+def valid_trace_id(value: Optional[str]) -> bool:
+    return bool(value) and bool(_TRACE_ID_RE.match(value))
+
+
+@contextmanager
+def span(name: str, trace_id: Optional[str] = None, **attrs):
+    """Span вокруг блока кода (и синхронного, и внутри корутины).
+
+    Без родителя начинается новый trace (trace_id можно передать явно).
+    """
+    parent = _current.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = trace_id or uuid.uuid4().hex, None
+
+    item = Span(name, trace_id, parent_id, attrs)
+    token = _current.set(item)
+    try:
+        yield item
+    except BaseException as e:
+        item.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        item.duration = time.perf_counter() - item._t0
+        _current.reset(token)
+        _record(item)
+
+
+def annotate(**attrs):
+    """Дописать атрибуты текущего span'а (если трассировка идёт)"""
+    item = _current.get()
+    if item is not None:
+        item.attrs.update(attrs)
+
+
+def _record(item: Span):
+    with _lock:
+        _buffer.append(item)
+    if _file_logger is not None:
+        _file_logger.info(json.dumps(item.to_dict(), ensure_ascii=False, default=str))
+
+
+def start():
+    """Включить запись в TRACE_FILE (фоновый поток с ротацией)"""
+    global _file_logger, _listener
+    if not TRACE_FILE or _listener is not None:
+        return
+    handler = logging.handlers.RotatingFileHandler(
+        TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+
+    logger = logging.getLogger("app.traces")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    _file_logger = logger
+
+
+def stop():
+    """Дописать очередь в файл и остановить фоновый поток"""
+    global _file_logger, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in list(_file_logger.handlers):
+        _file_logger.removeHandler(handler)
+    for handler in _listener.handlers:
+        handler.close()
+    _file_logger = _listener = None
+
+
+def traces(limit: int = 50, trace_id: Optional[str] = None, min_ms: float = 0, name: Optional[str] = None) -> list:
+    """Последние trace'ы из буфера, новые первыми.
+
+    Trace — корневой span и все его потомки (плоским списком по началу).
+    min_ms — только trace'ы с корнем не короче; name — с корнем этого имени.
+    """
+    with _lock:
+        items = list(_buffer)
+
+    grouped = OrderedDict()
+    for item in items:
+        grouped.setdefault(item.trace_id, []).append(item)
+
+    result = []
+    for tid in reversed(grouped):
+        if trace_id is not None and tid != trace_id:
+            continue
+        spans = sorted(grouped[tid], key=lambda s: s.start)
+        root = next((s for s in spans if s.parent_id is None), None)
+        if root is None:
+            continue  # корень ещё не завершён или уже вытеснен из буфера
+        if root.duration * 1000 < min_ms or (name is not None and root.name != name):
+            continue
+        result.append({
+            "trace_id": tid,
+            "name": root.name,
+            "start": round(root.start, 6),
+            "duration_ms": round(root.duration * 1000, 3),
+            "spans": [s.to_dict() for s in spans],
+        })
+        if len(result) >= limit:
+            break
+    return result
+
+
+class TracingMiddleware:
+    """ASGI-middleware: корневой span на каждый HTTP-запрос.
+
+    trace id берётся из заголовка X-Trace-Id (если он корректный) или
+    создаётся новый и возвращается клиенту в том же заголовке.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = None
+        for key, value in scope.get("headers", ()):
+            if key == b"x-trace-id":
+                incoming = value.decode("latin-1").lower()
+                break
+
+        trace_id = incoming if valid_trace_id(incoming) else None
+        with span(f"{scope['method']} {scope['path']}", trace_id=trace_id, path=scope["path"]) as root:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set(status=message["status"])
+                    headers = list(message.get("headers", ()))
+                    headers.append((TRACE_HEADER.lower().encode(), root.trace_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # имя — по шаблону маршрута, чтобы trace'ы одного обработчика группировались
+                root.name = f"{scope['method']} {route_template(scope)}"
@@ -1,7 +1,36 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.api.routes import chat, health, mode, reset, tasks, code
+from app.api.routes import admin, chat, health, mode, reset, tasks, code, metrics
+from app.core import tracing
+from app.core.metrics import MetricsMiddleware
+from app.services import evaluation, llm, summary
+from app.services.memory import sessions
+from app.services.sandbox_pool import pool as sandbox_pool
+from app.services.sandbox_scheduler import scheduler as sandbox_scheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # пул соединений к LLM создаётся один раз при старте воркера
+    llm.startup()
+    tracing.start()
+    # прогретые zygote-процессы песочницы
+    sandbox_pool.start()
+    yield
+    sandbox_scheduler.close()
+    sandbox_pool.close()
+    await summary.close()
+    await evaluation.close()
+    await llm.shutdown()
+    # дописать отложенные снапшоты сессий
+    sessions.close()
+    tracing.stop()
+
 
-app = FastAPI(title="Interviewer AI Backend")
+app = FastAPI(title="Interviewer AI Backend", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
 
 app.include_router(chat.router, prefix="/chat", tags=["Chat"])
 app.include_router(mode.router, prefix="/mode", tags=["Mode"])
@@ -9,3 +38,5 @@ app.include_router(health.router, prefix="/health", tags=["Health"])
 app.include_router(code.router, prefix="/code", tags=["Code"])
 app.include_router(reset.router, prefix="/reset", tags=["Reset"])
 app.include_router(tasks.router, prefix="/tasks", tags=["Tasks"])
+app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
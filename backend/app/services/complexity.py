@@ -0,0 +1,106 @@
+# app/services/complexity.py
+#
+# Подбор класса сложности по замерам времени решения на растущих n.
+
+import math
+from typing import Optional
+
+# Кандидаты: (обозначение, f(n)). Порядок — от простого к сложному.
+CLASSES = [
+    ("O(1)", lambda n: 1.0),
+    ("O(log n)", lambda n: math.log2(n)),
+    ("O(n)", lambda n: float(n)),
+    ("O(n log n)", lambda n: n * math.log2(n)),
+    ("O(n²)", lambda n: float(n) ** 2),
+    ("O(n³)", lambda n: float(n) ** 3),
+]
+
+# Более сложный класс выбирается, только если ошибка меньше хотя бы в столько раз
+SIMPLER_BIAS = 1.5
+# Меньше точек — вывод о сложности не делаем
+MIN_POINTS = 4
+# O(n) и O(n log n) на замеряемых n различаются наклоном log-log всего на
+# ~0.1 — меньше, чем добавляют кэши и рост хеш-таблиц у линейного решения.
+# При наклоне ниже этого O(n log n) не выбирается, считаем O(n).
+LINEAR_SLOPE = 1.25
+
+
+def _fit(sizes, times, f):
+    """МНК для t ≈ a + c·f(n) с относительной ошибкой -> (a, c, ошибка)"""
+    xs = [f(n) for n in sizes]
+    ws = [1.0 / (t * t) for t in times]
+
+    sw = sum(ws)
+    swx = sum(w * x for w, x in zip(ws, xs))
+    swxx = sum(w * x * x for w, x in zip(ws, xs))
+    swt = sum(w * t for w, t in zip(ws, times))
+    swxt = sum(w * x * t for w, x, t in zip(ws, xs, times))
+
+    det = sw * swxx - swx * swx
+    a = c = -1.0
+    if det > 1e-12 * sw * swxx:
+        a = (swxx * swt - swx * swxt) / det
+        c = (sw * swxt - swx * swt) / det
+    if a < 0 or c < 0:
+        # без постоянной составляющей: t ≈ c·f(n)
+        a, c = 0.0, swxt / swxx
+
+    error = sum(w * (t - a - c * x) ** 2 for w, x, t in zip(ws, xs, times))
+    return a, c, error
+
+
+def loglog_slope(sizes, times) -> float:
+    """Наклон прямой в координатах log n / log t по второй половине точек"""
+    half = len(sizes) // 2
+    xs = [math.log(n) for n in sizes[half:]]
+    ys = [math.log(t) for t in times[half:]]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    sxx = sum((x - mx) ** 2 for x in xs)
+    if sxx == 0:
+        return 0.0
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+
+
+def fit_complexity(sizes, times) -> Optional[dict]:
+    """Подобрать класс сложности по замерам (n, секунды).
+
+    Для каждого класса t ≈ a + c·f(n) подбирается МНК с весами 1/t²
+    (ошибка считается в долях, чтобы малые n не тонули в больших). Побеждает
+    класс с наименьшей ошибкой; более сложный — только с заметным отрывом.
+    O(n log n) при наклоне log-log около 1 записывается как O(n)
+    (см. LINEAR_SLOPE).
+    """
+    points = [(n, t) for n, t in zip(sizes, times) if n > 1 and t > 0]
+    if len(points) < MIN_POINTS:
+        return None
+    sizes = [n for n, _ in points]
+    times = [t for _, t in points]
+
+    errors = {}
+    best_name = None
+    for name, f in CLASSES:
+        if name == "O(1)":
+            mean = sum(times) / len(times)
+            errors[name] = sum(((t - mean) / t) ** 2 for t in times)
+        else:
+            _, _, errors[name] = _fit(sizes, times, f)
+        if best_name is None or errors[name] * SIMPLER_BIAS < errors[best_name]:
+            best_name = name
+
+    slope = loglog_slope(sizes, times)
+    if best_name == "O(n log n)" and slope < LINEAR_SLOPE:
+        best_name = "O(n)"
+
+    return {
+        "class": best_name,
+        "slope": round(slope, 2),
+        "residual": round(errors[best_name] / len(times), 4),
+    }
+
+
+def slower_than(measured: str, expected: str) -> bool:
+    """Замеренный класс хуже ожидаемого (неизвестные классы не сравниваются)"""
+    names = [name for name, _ in CLASSES]
+    if measured not in names or expected not in names:
+        return measured != expected
+    return names.index(measured) > names.index(expected)
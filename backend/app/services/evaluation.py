@@ -0,0 +1,238 @@
+# app/services/evaluation.py
+#
+# Оценка кандидата по ходу интервью. Каждый ответ на теоретический вопрос
+# оценивается коротким фоновым запросом к LLM (ход кандидата этого не
+# ждёт), результат каждого /code/run записывается сразу — он известен из
+# песочницы. Всё копится в Memory.evaluation, и итоговый отчёт собирается
+# из этой записи локально: без большого запроса по всей истории и с
+# учётом реплик, которые уже вытеснены из Memory.history.
+
+import asyncio
+import json
+import os
+import re
+from collections import deque
+from typing import Optional
+
+from app.services import llm
+from app.services.complexity import slower_than
+from app.services.memory import Memory, sessions
+
+# Ограничение на ответ LLM с оценкой (токены)
+EVAL_MAX_TOKENS = int(os.getenv("EVAL_MAX_TOKENS", "150"))
+# Сколько итоговый отчёт ждёт ещё не оценённые ответы (сек)
+EVAL_FINAL_WAIT = float(os.getenv("EVAL_FINAL_WAIT", "5"))
+# Сколько символов вопроса и ответа уходит на оценку
+EVAL_TEXT_LIMIT = 1500
+
+GRADE_PROMPT = (
+    "Ты оцениваешь ответ кандидата на вопрос технического интервью (Python).\n"
+    "Верни только JSON без пояснений:\n"
+    '{"score": 0|1|2, "strength": "...", "gap": "..."}\n'
+    "score: 0 — неверно или не по теме, 1 — частично, 2 — верно и полно.\n"
+    "strength — что кандидат знает хорошо (до 8 слов) или null.\n"
+    "gap — чего в ответе не хватает (до 8 слов) или null."
+)
+
+_JSON_RE = re.compile(r"\{[\s\S]*\}")
+
+_workers = {}  # session_id -> asyncio.Task
+_queues = {}  # session_id -> deque[(memory, entry, question, answer)]
+
+
+def empty() -> dict:
+    """Пустая запись оценки для нового интервью"""
+    return {"theory": [], "coding": []}
+
+
+# ---------- теория ----------
+
+def record_theory_answer(session_id: str, memory: Memory, question: str, answer: str):
+    """Записать ответ на вопрос и поставить его на фоновую оценку"""
+    entry = {"question": question.strip()[:300], "score": None, "strength": None, "gap": None}
+    memory.evaluation["theory"].append(entry)
+
+    queue = _queues.setdefault(session_id, deque())
+    queue.append((memory, entry, question[:EVAL_TEXT_LIMIT], answer[:EVAL_TEXT_LIMIT]))
+
+    running = _workers.get(session_id)
+    if running is not None and not running.done():
+        return  # ответ оценит уже работающая задача сессии
+
+    task = asyncio.get_running_loop().create_task(_drain(session_id))
+    _workers[session_id] = task
+
+    def forget(_):
+        if _workers.get(session_id) is task:
+            del _workers[session_id]
+
+    task.add_done_callback(forget)
+
+
+def parse_grade(text: str) -> Optional[dict]:
+    """Ответ LLM -> {score, strength, gap} или None"""
+    match = _JSON_RE.search(text or "")
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+        score = int(data["score"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    return {
+        "score": min(2, max(0, score)),
+        "strength": (data.get("strength") or None) and str(data["strength"])[:120],
+        "gap": (data.get("gap") or None) and str(data["gap"])[:120],
+    }
+
+
+async def grade(question: str, answer: str) -> Optional[dict]:
+    messages = [
+        {"role": "system", "content": GRADE_PROMPT},
+        {"role": "user", "content": f"Вопрос:\n{question}\n\nОтвет кандидата:\n{answer}"},
+    ]
+    text = await llm.chat(messages, max_tokens=EVAL_MAX_TOKENS, temperature=0.0, stage="evaluation")
+    return parse_grade(text)
+
+
+async def _drain(session_id: str):
+    """Оценить ответы сессии по очереди"""
+    queue = _queues[session_id]
+    while queue:
+        memory, entry, question, answer = queue.popleft()
+        try:
+            result = await grade(question, answer)
+        except Exception:
+            result = None
+        # интервью могли сбросить, а сессию — вытеснить или перечитать из БД,
+        # пока шла оценка: устаревший Memory не сохраняем
+        if result is None or sessions.peek(session_id) is not memory:
+            continue
+        if not any(e is entry for e in memory.evaluation["theory"]):
+            continue
+        entry.update(result)
+        memory.theory_total += 1
+        if result["score"] >= 1:
+            memory.theory_correct += 1
+        memory.theory_fail_streak = memory.theory_fail_streak + 1 if result["score"] == 0 else 0
+        sessions.save(session_id, memory)
+    del _queues[session_id]
+
+
+async def wait(session_id: str, timeout: float = EVAL_FINAL_WAIT):
+    """Дождаться оценки уже отправленных ответов (не дольше timeout)"""
+    task = _workers.get(session_id)
+    if task is not None and not task.done():
+        await asyncio.wait({task}, timeout=timeout)
+
+
+async def close():
+    """Отменить незавершённые оценки (при остановке приложения)"""
+    pending = list(_workers.values())
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    _workers.clear()
+    _queues.clear()
+
+
+# ---------- практика ----------
+
+def record_code_run(memory: Memory, code_result: dict):
+    """Записать результат запуска кода по текущей задаче"""
+    task_id = memory.current_task or code_result.get("task")
+    coding = memory.evaluation["coding"]
+    if coding and coding[-1]["task_id"] == task_id:
+        entry = coding[-1]
+    else:
+        entry = {"task_id": task_id, "attempts": 0, "solved": False, "passed": 0, "total": 0}
+        coding.append(entry)
+        memory.coding_total += 1
+
+    tests = code_result.get("tests") or []
+    entry["attempts"] += 1
+    entry["passed"] = sum(1 for t in tests if t.get("status") == "passed")
+    entry["total"] = len(tests)
+    if code_result["success"] and not entry["solved"]:
+        entry["solved"] = True
+        memory.coding_success += 1
+
+    complexity = code_result.get("complexity") or {}
+    if complexity.get("class"):
+        entry["complexity"] = complexity["class"]
+        entry["expected"] = complexity.get("expected")
+
+
+def record_task_failed(memory: Memory):
+    """Задача провалена (кончились подсказки)"""
+    memory.coding_fail += 1
+
+
+# ---------- итоговый отчёт ----------
+
+def _percent(part: float, whole: float) -> Optional[int]:
+    return round(100 * part / whole) if whole else None
+
+
+def _unique(items: list, limit: int = 5) -> list:
+    seen = []
+    for item in items:
+        if item and item not in seen:
+            seen.append(item)
+    return seen[:limit]
+
+
+def format_report(memory: Memory) -> str:
+    """Итоговый отчёт из записи оценки, без запроса к LLM"""
+    theory = memory.evaluation["theory"]
+    coding = memory.evaluation["coding"]
+
+    graded = [e for e in theory if e["score"] is not None]
+    theory_pct = _percent(sum(e["score"] for e in graded), 2 * len(graded))
+    solved = sum(1 for e in coding if e["solved"])
+    practice_pct = _percent(solved, len(coding))
+
+    strengths = [e["strength"] for e in graded if e["score"] >= 1]
+    gaps = [e["gap"] for e in graded if e["score"] < 2]
+    for e in coding:
+        if e["solved"]:
+            note = f"решена задача {e['task_id']}"
+            if e.get("complexity"):
+                note += f" ({e['complexity']})"
+            strengths.append(note)
+            if e.get("expected") and e.get("complexity") and slower_than(e["complexity"], e["expected"]):
+                gaps.append(
+                    f"{e['task_id']}: сложность {e['complexity']} при ожидаемой {e['expected']}"
+                )
+        else:
+            gaps.append(f"{e['task_id']}: пройдено {e['passed']} из {e['total']} тестов")
+
+    if theory_pct is None:
+        theory_line = "нет оценённых ответов"
+    else:
+        theory_line = f"{theory_pct}%"
+        if len(graded) < len(theory):
+            theory_line += f" (оценено ответов: {len(graded)} из {len(theory)})"
+    practice_line = (
+        f"{solved} из {len(coding)} задач ({practice_pct}%)" if coding else "задачи не выдавались"
+    )
+
+    scores = [(p, w) for p, w in ((theory_pct, 0.4), (practice_pct, 0.6)) if p is not None]
+    total = sum(p * w for p, w in scores) / sum(w for _, w in scores) if scores else 0
+    if total >= 75:
+        verdict = "Рекомендую"
+    elif total >= 50:
+        verdict = "Рассматриваю"
+    else:
+        verdict = "Не рекомендую"
+
+    def bullets(items):
+        return "\n".join(f"— {item}" for item in _unique(items)) or "— недостаточно данных"
+
+    return (
+        f"**Теория:** {theory_line}\n"
+        f"**Практика:** {practice_line}\n"
+        f"**Сильные стороны:**\n{bullets(strengths)}\n"
+        f"**Зоны роста:**\n{bullets(gaps)}\n"
+        f"**Вердикт:** {verdict}"
+    )
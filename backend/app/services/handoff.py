@@ -0,0 +1,204 @@
+# app/services/handoff.py
+#
+# Передача следующей задачи от LLM на стадии feedback. Модель начинает
+# ответ строкой JSON — {"task_id": "two_sum"}, если нужно выдать задачу,
+# или {"task_id": null}, — а дальше пишет обычный текст для кандидата.
+# Заголовок разбирается по мере прихода токенов: как только task_id
+# известен и сверен с банком задач, задачу можно отдавать в редактор, не
+# дожидаясь конца ответа. Условие и шаблон всегда берутся из банка, а не
+# из текста модели.
+#
+# Испорченная передача чинится на месте, без ещё одного запроса к LLM:
+# битый JSON — task_id достаётся регуляркой; неизвестный или уже выданный
+# task_id — ближайший похожий из банка (difflib) или следующая задача
+# уровня; ответ без заголовка — разбор старого формата
+# task_id/description/template.
+
+import difflib
+import json
+import re
+from typing import Callable, Optional
+
+from app.core import metrics
+from app.services.memory import Memory
+from app.services.tasks import bank, get_task, sample_task
+
+# Заголовок длиннее этого (символов) — не заголовок, а обычный текст
+HANDOFF_MAX_HEADER = 300
+# Насколько похожим должен быть неизвестный task_id на задачу из банка
+HANDOFF_MATCH_CUTOFF = 0.75
+
+HANDOFF_INSTRUCTIONS = (
+    "Первой строкой ответа верни JSON без пояснений и без markdown:\n"
+    '{"task_id": "<id следующей задачи>"} — если все тесты пройдены;\n'
+    '{"task_id": null} — если есть ошибки.\n'
+    "Со второй строки — текст для кандидата. Условие и шаблон задачи не пиши, "
+    "их покажет редактор.\n"
+)
+
+HANDOFFS = metrics.Counter(
+    "llm_task_handoff_total", "Разбор передачи следующей задачи от LLM", ("outcome",),
+)
+
+# task_id в кавычках — можно брать, не дожидаясь конца заголовка
+_TASK_ID_RE = re.compile(r"""task_id["']?\s*:\s*["']([^"'\n]*)["']""")
+# в законченном заголовке — и без кавычек (null, None, two_sum)
+_LOOSE_TASK_ID_RE = re.compile(r"""task_id["']?\s*:\s*["']?([\w\-]+)""")
+_LEGACY_TASK_ID_RE = re.compile(r"task_id:\s*([\w\-]+)", re.IGNORECASE)
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*")
+
+
+def _normalize(raw: str) -> str:
+    return re.sub(r"[\s\-]+", "_", raw.strip().strip("`*").lower())
+
+
+def resolve(raw: Optional[str], memory: Memory) -> tuple:
+    """task_id от модели -> (task_id из банка или None, исход для метрики)"""
+    seen = set(memory.seen_tasks)
+    if raw and raw in bank and raw not in seen:
+        return raw, "ok"
+
+    key = _normalize(raw or "")
+    if key in bank and key not in seen:
+        return key, "repaired"
+    if key:
+        unseen = [tid for tids in bank.by_level.values() for tid in tids if tid not in seen]
+        match = difflib.get_close_matches(key, unseen, n=1, cutoff=HANDOFF_MATCH_CUTOFF)
+        if match:
+            return match[0], "repaired"
+
+    # модель хотела выдать задачу, но назвала несуществующую или повторила
+    task_id = sample_task(memory.coding_level, exclude=seen)
+    return task_id, "sampled" if task_id else "invalid"
+
+
+def task_payload(task_id: str) -> dict:
+    task = get_task(task_id)
+    return {"task_id": task_id, "description": task["description"], "template": task["template"]}
+
+
+class HandoffParser:
+    """Потоковый разбор ответа feedback.
+
+    feed() получает фрагменты ответа модели; текст после заголовка уходит
+    в on_text, найденная задача — в on_task (один раз, сразу как task_id
+    стал известен). finish() вызывается после конца ответа.
+    accept_task=False — задачу не выдавать (тесты не пройдены), заголовок
+    только вырезается из текста.
+    """
+
+    def __init__(
+        self,
+        memory: Memory,
+        accept_task: bool = True,
+        on_text: Optional[Callable[[str], None]] = None,
+        on_task: Optional[Callable[[dict], None]] = None,
+    ):
+        self.memory = memory
+        self.accept_task = accept_task
+        self.on_text = on_text
+        self.on_task = on_task
+        self.task: Optional[dict] = None
+        self.legacy = False  # задача взята из ответа в старом формате
+        self._buffer = ""
+        self._in_header = True
+        self._declared = False  # task_id в заголовке уже найден
+        self._text_started = False
+        self._parts = []
+
+    @property
+    def text(self) -> str:
+        """Текст ответа для кандидата (без заголовка)"""
+        return "".join(self._parts)
+
+    def feed(self, chunk: str):
+        if not self._in_header:
+            self._emit(chunk)
+            return
+        self._buffer += chunk
+        self._scan_header(final=False)
+
+    def finish(self) -> Optional[dict]:
+        """Конец ответа -> задача для редактора или None"""
+        if self._in_header:
+            self._scan_header(final=True)
+        if not self._declared and self.accept_task:
+            # заголовка нет — ответ в старом формате task_id/description/template
+            match = _LEGACY_TASK_ID_RE.search(self.text)
+            if match:
+                self._declare(match.group(1), legacy=True)
+        if not self._declared:
+            HANDOFFS.inc(outcome="none")
+        return self.task
+
+    # ---------- внутреннее ----------
+
+    def _emit(self, text: str):
+        if not self._text_started:
+            text = text.lstrip("\n")  # перевод строки после заголовка
+        if not text:
+            return
+        self._text_started = True
+        self._parts.append(text)
+        if self.on_text is not None:
+            self.on_text(text)
+
+    def _scan_header(self, final: bool):
+        buffer = self._buffer
+        head = _FENCE_RE.sub("", buffer, count=1)
+        if not final and (not head.strip() or "```json".startswith(buffer.lstrip())):
+            return  # пока только пробелы или начало ```json
+        if not head.lstrip().startswith("{"):
+            # ответ без заголовка — весь текст кандидату
+            self._end_header(buffer)
+            return
+
+        if not self._declared:
+            match = _TASK_ID_RE.search(head)
+            if match:
+                self._declare(match.group(1))
+
+        end = head.find("}")
+        if end < 0:
+            if final or len(head) > HANDOFF_MAX_HEADER:
+                self._end_header("" if self._declared else buffer)
+            return
+        rest = head[end + 1:]
+        if not self._declared:
+            self._parse_header(head[:end + 1])
+        # закрывающий ``` после заголовка в блоке кода
+        fence = re.match(r"\s*```", rest)
+        if fence is None and not final and rest.strip() in ("", "`", "``"):
+            return  # ещё не ясно, будет ли закрывающий ```
+        self._end_header(rest[fence.end():] if fence else rest)
+
+    def _parse_header(self, header: str):
+        try:
+            data = json.loads(header.strip())
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and "task_id" in data:
+            self._declare(data["task_id"])
+            return
+        match = _LOOSE_TASK_ID_RE.search(header)
+        if match:
+            self._declare(match.group(1))
+
+    def _declare(self, raw, legacy: bool = False):
+        self._declared = True
+        self.legacy = legacy
+        if not raw or raw in ("null", "None") or not self.accept_task:
+            HANDOFFS.inc(outcome="none")
+            return
+        task_id, outcome = resolve(str(raw), self.memory)
+        HANDOFFS.inc(outcome="legacy" if legacy and task_id else outcome)
+        if task_id is None:
+            return
+        self.task = task_payload(task_id)
+        if self.on_task is not None:
+            self.on_task(self.task)
+
+    def _end_header(self, rest: str):
+        self._in_header = False
+        self._buffer = ""
+        self._emit(rest)
@@ -0,0 +1,421 @@
+# app/services/llm.py
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from app.core import metrics, tracing
+from app.core.lru import LRUCache
+
+
+API_KEY = os.getenv("API_KEY")
+# Адрес OpenAI-совместимого API; для нагрузочных тестов — локальная
+# заглушка (scripts/stub_llm.py)
+BASE_URL = os.getenv("LLM_BASE_URL", "https://llm.t1v.scibox.tech/")
+MODEL_NAME = os.getenv("LLM_MODEL", "qwen3-coder-30b-a3b-instruct-fp8")
+
+# Размер пула соединений к LLM. Один воркер держит столько запросов
+# одновременно, keep-alive соединения переиспользуются между вызовами.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "32"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+
+# Кэш ответов для вызовов с cache=True: размер и время жизни записи (сек)
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+
+# Дедлайн на весь вызов с повторами (сек) по стадиям; остальные — LLM_TIMEOUT
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "45"))
+LLM_DEADLINES = {
+    "intro": 20,
+    "theory": 30,
+    "feedback": LLM_TIMEOUT,
+    "summary": 30,
+    "evaluation": 20,
+    "present": 15,
+}
+# Повторы при временных ошибках: число и база экспоненциальной паузы (сек)
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.25"))
+# Hedging: если ответа нет дольше p95 стадии — второй такой же запрос,
+# берётся первый ответ. Только для непотоковых вызовов.
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") != "0"
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_LATENCY_WINDOW = 200
+# Доля запросов, которые можно дублировать: при перегрузке (ответы медленные
+# у всех) hedging иначе удвоил бы нагрузку на upstream
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+# Circuit breaker: после стольких неудач подряд запросы не отправляются
+# LLM_BREAKER_COOLDOWN секунд, затем пропускается одна пробная попытка
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Ошибки, после которых имеет смысл повторить запрос
+TRANSIENT_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_cache = LRUCache(LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, sliding=False)
+# длительности успешных запросов по стадиям — для задержки hedging
+_latencies = {}
+
+
+class _HedgeBudget:
+    """Скользящее окно последних запросов: сколько из них дублировались"""
+
+    def __init__(self, ratio: float = LLM_HEDGE_BUDGET, window: int = LLM_LATENCY_WINDOW):
+        self.ratio = ratio
+        self._recent = deque(maxlen=window)
+        self._hedged = 0
+
+    def _push(self, hedged: bool):
+        if len(self._recent) == self._recent.maxlen:
+            self._hedged -= self._recent[0]
+        self._recent.append(hedged)
+        self._hedged += hedged
+
+    def request(self):
+        self._push(False)
+
+    def try_hedge(self) -> bool:
+        if self._hedged + 1 > self.ratio * len(self._recent):
+            return False
+        self._push(True)
+        return True
+
+
+_hedge_budget = _HedgeBudget()
+
+
+class LLMUnavailable(Exception):
+    """LLM не ответила: истёк дедлайн, кончились повторы или открыт breaker"""
+
+
+class CircuitBreaker:
+    """Размыкатель цепи для upstream LLM.
+
+    closed — запросы идут; после failures неудач подряд — open: запросы
+    сразу отклоняются; через cooldown — half-open: одна пробная попытка,
+    успех замыкает цепь, неудача снова размыкает. Состояние меняется
+    только из event loop, блокировки не нужны.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._streak = 0
+        self._opened_at = None
+        self._probe = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probe:
+            self._probe = True
+            return True
+        return False
+
+    def success(self):
+        self._streak = 0
+        self._opened_at = None
+        self._probe = False
+
+    def failure(self):
+        self._streak += 1
+        if self._probe or self._streak >= self.failures:
+            self._opened_at = time.monotonic()
+        self._probe = False
+
+    def release(self):
+        """Попытка закончилась без вердикта (ошибка запроса, а не upstream)"""
+        self._probe = False
+
+
+breaker = CircuitBreaker()
+metrics.Gauge("llm_circuit_open", "1, если circuit breaker LLM разомкнут", fn=lambda: int(breaker.state == "open"))
+
+_http_client: Optional[httpx.AsyncClient] = None
+client: Optional[AsyncOpenAI] = None
+
+
+def startup():
+    """Создать асинхронный клиент и пул соединений (один раз на процесс)"""
+    global _http_client, client
+    if client is not None:
+        return client
+
+    _http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(120.0, connect=10.0),
+    )
+    # повторы делает _call с общим дедлайном, у SDK свои выключены
+    client = AsyncOpenAI(api_key=API_KEY, base_url=BASE_URL, http_client=_http_client, max_retries=0)
+    return client
+
+
+async def shutdown():
+    """Закрыть пул соединений"""
+    global _http_client, client
+    if client is not None:
+        await client.close()
+    _http_client = None
+    client = None
+
+
+def get_client() -> AsyncOpenAI:
+    return client if client is not None else startup()
+
+
+def _normalize(text: str) -> str:
+    return "\n".join(line.rstrip() for line in (text or "").strip().splitlines())
+
+
+def cache_key(messages: list, max_tokens: int, temperature: float, scope: Optional[list] = None) -> str:
+    """Ключ кэша: модель + нормализованные сообщения (или scope) + параметры"""
+    if scope is None:
+        scope = [(m["role"], _normalize(m.get("content"))) for m in messages]
+    material = json.dumps(
+        [MODEL_NAME, scope, round(temperature, 3), max_tokens], ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+async def chat(
+    messages: list,
+    max_tokens: int,
+    temperature: float,
+    on_token: Optional[Callable[[str], None]] = None,
+    cache: bool = False,
+    cache_scope: Optional[list] = None,
+    mode: str = "",
+    stage: str = "",
+    deadline: Optional[float] = None,
+    fallback: Optional[Callable[[], str]] = None,
+) -> str:
+    """Один запрос к LLM, не блокирующий event loop.
+
+    Если передан on_token — ответ запрашивается потоком, и каждый фрагмент
+    текста отдаётся в on_token по мере генерации. Возвращается полный текст.
+
+    cache=True — ответ берётся из кэша, если такой же запрос уже был.
+    cache_scope (JSON-совместимый список) заменяет сообщения в ключе, когда
+    ответ по смыслу зависит только от части контекста.
+
+    mode/stage — метки для метрик (/metrics; неизвестный mode пишется как
+    "other"); по stage выбирается дедлайн (LLM_DEADLINES), если deadline
+    не задан явно.
+
+    Временные ошибки повторяются с паузой, непотоковые запросы
+    дублируются после p95 стадии (hedging). Если LLM так и не ответила,
+    возвращается fallback() (заготовленный ответ стадии, в кэш не
+    попадает), а без fallback — исключение LLMUnavailable. Если поток
+    оборвался после выданных токенов, возвращается выданная часть (в кэш
+    не попадает, в трейсе — incomplete), fallback не используется.
+    """
+    mode = metrics.mode_label(mode)
+    with tracing.span("llm.chat", mode=mode, stage=stage, stream=on_token is not None) as span:
+        key = None
+        if cache:
+            key = cache_key(messages, max_tokens, temperature, cache_scope)
+            cached = _cache.get(key)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                metrics.LLM_CACHE_HITS.inc(mode=mode, stage=stage)
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+
+        try:
+            answer, usage, complete = await _call(
+                messages, max_tokens, temperature, on_token, mode, stage,
+                deadline or LLM_DEADLINES.get(stage, LLM_TIMEOUT),
+            )
+        except LLMUnavailable as e:
+            if fallback is None:
+                raise
+            metrics.LLM_FALLBACKS.inc(stage=stage)
+            span.set(fallback=str(e))
+            answer = fallback()
+            if on_token is not None:
+                on_token(answer)
+            return answer
+        if not complete:
+            span.set(incomplete=True)
+        if usage is not None:
+            metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, mode=mode, stage=stage, kind="prompt")
+            metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, mode=mode, stage=stage, kind="completion")
+            span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        if key is not None and answer and complete:
+            _cache.set(key, answer)
+        return answer
+
+
+async def _call(messages, max_tokens, temperature, on_token, mode, stage, deadline):
+    """Запрос с дедлайном, повторами, hedging и circuit breaker.
+
+    -> (текст, usage, complete); complete=False — поток оборван (дедлайн
+    или ошибка upstream) после того, как часть текста уже выдана.
+    """
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + deadline
+    delivered = []
+
+    def track(text):
+        delivered.append(text)
+        on_token(text)
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise LLMUnavailable("circuit breaker is open")
+
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            if on_token is None:
+                request = _hedged(messages, max_tokens, temperature, stage)
+            else:
+                request = _complete(messages, max_tokens, temperature, track)
+            text, usage = await asyncio.wait_for(request, max(0.0, expires - loop.time()))
+            outcome = "ok"
+            breaker.success()
+            _latencies.setdefault(stage, deque(maxlen=LLM_LATENCY_WINDOW)).append(time.perf_counter() - started)
+            return text, usage, True
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            breaker.failure()
+            if delivered:
+                # поток оборвался по дедлайну — отдаём то, что кандидат уже видит
+                return "".join(delivered), None, False
+            raise LLMUnavailable(f"deadline {deadline}s exceeded")
+        except TRANSIENT_ERRORS as e:
+            breaker.failure()
+            if delivered:
+                # повторять поток после выданных токенов нельзя — текст
+                # задвоится, а заготовка разошлась бы с тем, что кандидат
+                # уже видит: отдаём выданное, как при дедлайне
+                return "".join(delivered), None, False
+            if attempt >= LLM_RETRIES:
+                raise LLMUnavailable(f"{type(e).__name__}: {e}") from e
+        except BaseException:
+            breaker.release()
+            raise
+        finally:
+            metrics.LLM_LATENCY.observe(
+                time.perf_counter() - started, mode=mode, stage=stage, outcome=outcome
+            )
+
+        # full jitter: пауза случайна в [0, base * 2^attempt]
+        pause = random.uniform(0, LLM_RETRY_BASE * 2 ** attempt)
+        if loop.time() + pause >= expires:
+            raise LLMUnavailable(f"deadline {deadline}s exceeded")
+        attempt += 1
+        metrics.LLM_RETRIES.inc(stage=stage)
+        tracing.annotate(retries=attempt)
+        await asyncio.sleep(pause)
+
+
+def hedge_delay(stage: str) -> Optional[float]:
+    """Через сколько секунд дублировать запрос: p95 стадии (None — мало данных)"""
+    window = _latencies.get(stage)
+    if not LLM_HEDGE or window is None or len(window) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(window)
+    return max(LLM_HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95) - 1])
+
+
+async def _hedged(messages, max_tokens, temperature, stage):
+    """Непотоковый запрос; если он дольше p95 — параллельно второй, берётся первый ответ"""
+    delay = hedge_delay(stage)
+    _hedge_budget.request()
+    first = asyncio.ensure_future(_complete(messages, max_tokens, temperature, None))
+    if delay is None:
+        return await first
+
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and _hedge_budget.try_hedge():
+            metrics.LLM_HEDGES.inc(stage=stage)
+            tracing.annotate(hedged=True)
+            tasks.add(asyncio.ensure_future(_complete(messages, max_tokens, temperature, None)))
+
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _complete(
+    messages: list,
+    max_tokens: int,
+    temperature: float,
+    on_token: Optional[Callable[[str], None]],
+):
+    """-> (текст ответа, usage или None)"""
+    if on_token is None:
+        resp = await get_client().chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        return resp.choices[0].message.content, resp.usage
+
+    stream = await get_client().chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+        # последний чанк несёт usage (с пустым choices)
+        stream_options={"include_usage": True},
+    )
+    started = time.perf_counter()
+    parts = []
+    usage = None
+    async for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if not parts:
+                tracing.annotate(ttft_ms=round((time.perf_counter() - started) * 1000, 3))
+            parts.append(delta)
+            on_token(delta)
+    return "".join(parts), usage
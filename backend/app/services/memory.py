@@ -1,8 +1,57 @@
 # app/services/memory.py
 
+import os
+import re
+import time
+from typing import Optional
+
+from app.core import metrics
+from app.core.lru import LRUCache
+from app.core.tokens import count_tokens
+from app.services.session_backend import SQLiteSessionBackend
+
+# Бюджет истории диалога в токенах по стадиям интервью. Что не влезает,
+# уходит в evicted и сворачивается в краткое содержание (см. summary.py).
+CONTEXT_BUDGET = int(os.getenv("CONTEXT_BUDGET", "3000"))
+CONTEXT_BUDGETS = {
+    "intro": 1000,
+    "level_select": 1000,
+    "theory": CONTEXT_BUDGET,
+    "practice_confirm": 1500,
+    "coding": 1500,
+    "feedback": CONTEXT_BUDGET,
+}
+# Одно сообщение (например, вставленный код) сокращается до стольких токенов
+MESSAGE_TOKEN_LIMIT = int(os.getenv("MESSAGE_TOKEN_LIMIT", "1500"))
+
+SUMMARY_HEADER = "Краткое содержание предыдущей части интервью:\n"
+
+
+def clip_message(text: str, limit: int = MESSAGE_TOKEN_LIMIT) -> str:
+    """Сократить слишком длинное сообщение, оставив начало и конец"""
+    tokens = count_tokens(text)
+    if tokens <= limit:
+        return text
+    keep = len(text) * limit // tokens
+    head, tail = keep * 2 // 3, keep // 3
+    return text[:head] + "\n…[фрагмент сокращён]…\n" + text[len(text) - tail:]
+
+
 class Memory:
-    def __init__(self, max_history=12):
-        self.max_history = max_history
+    # поля, которые попадают в снапшот сессии
+    SNAPSHOT_FIELDS = (
+        "mode", "stage", "interview_level", "coding_level", "current_task",
+        "hint_count", "theory_questions_asked",
+        "theory_total", "theory_correct", "theory_fail_streak",
+        "coding_total", "coding_success", "coding_fail",
+        "seen_tasks", "evaluation", "summary", "evicted", "history",
+    )
+
+    def __init__(self):
+        # версия снапшота (растёт при каждом сохранении сессии)
+        self.version = 0
+        # когда версия последний раз сверялась с БД (time.monotonic)
+        self.checked_at = 0.0
         
         # режим интервью
         self.mode = "TECH"
@@ -35,24 +84,72 @@ class Memory:
         self.coding_success = 0
         self.coding_fail = 0
         
-        # история диалога
+        # оценка по ходу интервью: ответы на теорию и задачи (см. evaluation.py)
+        self.evaluation = {"theory": [], "coding": []}
+        
+        # задачи, уже выданные в этой сессии (не сбрасываются при reset_full,
+        # чтобы повторное интервью не начиналось с тех же задач)
+        self.seen_tasks = []
+        
+        # история диалога (в пределах токен-бюджета стадии) и число токенов
+        # каждого её сообщения (в снапшот не входит; None — ещё не посчитано)
         self.history = []
+        self._history_tokens = []
+        
+        # краткое содержание вытесненной части диалога и сообщения,
+        # которые ещё ждут сворачивания в него
+        self.summary = ""
+        self.evicted = []
+    
+    def mark_task_seen(self, task_id: str):
+        """Запомнить выданную задачу"""
+        if task_id not in self.seen_tasks:
+            self.seen_tasks.append(task_id)
     
     def add_user_message(self, message: str):
         """Добавить сообщение пользователя"""
-        self.history.append({"role": "user", "content": message})
-        self._trim()
+        self._append("user", message)
     
     def add_assistant_message(self, message: str):
         """Добавить сообщение ассистента"""
-        self.history.append({"role": "assistant", "content": message})
+        self._append("assistant", message)
+    
+    def _append(self, role: str, message: str):
+        content, tokens = message, count_tokens(message)
+        if tokens > MESSAGE_TOKEN_LIMIT:
+            content = clip_message(message)
+            tokens = count_tokens(content)
+        self._sync_tokens()
+        self.history.append({"role": role, "content": content})
+        self._history_tokens.append(tokens)
         self._trim()
     
+    def _sync_tokens(self):
+        """Историю заменили целиком (снапшот) — токены посчитаются заново при обрезке"""
+        if len(self._history_tokens) != len(self.history):
+            self._history_tokens = [None] * len(self.history)
+    
     def _trim(self):
-        """Ограничить историю по размеру"""
-        extra = len(self.history) - self.max_history
-        if extra > 0:
-            self.history = self.history[extra:]
+        """Оставить в истории хвост в пределах токен-бюджета стадии.
+
+        Последнее сообщение остаётся всегда; вытесненные копятся в evicted.
+        """
+        self._sync_tokens()
+        budget = CONTEXT_BUDGETS.get(self.stage, CONTEXT_BUDGET)
+        used = 0
+        cut = len(self.history)
+        while cut > 0:
+            tokens = self._history_tokens[cut - 1]
+            if tokens is None:
+                tokens = self._history_tokens[cut - 1] = count_tokens(self.history[cut - 1]["content"])
+            used += tokens
+            if used > budget and cut < len(self.history):
+                break
+            cut -= 1
+        if cut > 0:
+            self.evicted.extend(self.history[:cut])
+            self.history = self.history[cut:]
+            self._history_tokens = self._history_tokens[cut:]
     
     def reset_full(self):
         """Полный сброс всей логики интервью"""
@@ -71,13 +168,135 @@ class Memory:
         self.coding_total = 0
         self.coding_success = 0
         self.coding_fail = 0
+        self.evaluation = {"theory": [], "coding": []}
         
         self.history = []
+        self._history_tokens = []
+        self.summary = ""
+        self.evicted = []
     
     def get_context(self):
-        """Получить контекст диалога"""
-        return self.history
+        """Получить контекст диалога: краткое содержание + хвост истории"""
+        self._trim()
+        if not self.summary:
+            return self.history
+        return [{"role": "system", "content": SUMMARY_HEADER + self.summary}] + self.history
+    
+    def snapshot(self) -> dict:
+        """Состояние интервью в виде JSON-совместимого словаря"""
+        return {name: getattr(self, name) for name in self.SNAPSHOT_FIELDS}
+    
+    @classmethod
+    def from_snapshot(cls, data: dict, version: int = 0) -> "Memory":
+        """Восстановить Memory из снапшота"""
+        memory = cls()
+        for name in cls.SNAPSHOT_FIELDS:
+            if name in data:
+                setattr(memory, name, data[name])
+        memory.version = version
+        return memory
+
+
+# Ёмкость хранилища сессий и время жизни неактивной сессии (сек)
+SESSION_CAPACITY = int(os.getenv("SESSION_CAPACITY", "5000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "7200"))
+
+# Файл SQLite для снапшотов сессий; пустое значение — только в памяти
+SESSION_DB = os.getenv("SESSION_DB", "")
+# Сколько секунд после своей записи или сверки воркер не сверяет версию
+# сессии с БД. По умолчанию 0 — сверять при каждом обращении; больше нуля
+# можно ставить только со sticky-сессиями на балансировщике (все ходы
+# сессии идут в один воркер), иначе воркер может отдать устаревшее
+# состояние.
+SESSION_RECHECK = float(os.getenv("SESSION_RECHECK", "0"))
+
+_SESSION_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def is_valid_session_id(session_id: str) -> bool:
+    return bool(session_id) and _SESSION_ID_RE.fullmatch(session_id) is not None
+
+
+class SessionStore:
+    """Состояние интервью по session_id: LRU-вытеснение и idle TTL.
+
+    С backend сессии переживают рестарт и видны всем воркерам: промах кэша
+    поднимает снапшот из БД, а более новая версия в БД (ход обработал
+    другой воркер) перечитывается. Запись — compare-and-set: если тот же
+    ход параллельно сохранил другой воркер, снапшот этого не пишется, а
+    сессия перечитывается из БД при следующем get() (конфликт считается в
+    session_write_conflicts_total). С recheck > 0 версия сверяется не чаще
+    раза в recheck секунд (только для sticky-сессий).
+    """
+
+    def __init__(
+        self,
+        capacity: int = SESSION_CAPACITY,
+        ttl: float = SESSION_TTL,
+        backend: Optional[SQLiteSessionBackend] = None,
+        recheck: float = SESSION_RECHECK,
+    ):
+        self._sessions = LRUCache(capacity, ttl=ttl)
+        self.backend = backend
+        self.recheck = recheck
+
+    def get(self, session_id: str) -> Memory:
+        """Вернуть Memory сессии, создав новую при необходимости"""
+        memory = self._sessions.get(session_id)
+
+        if self.backend is not None:
+            if memory is None:
+                stored = self.backend.load(session_id)
+                if stored is not None:
+                    version, data = stored
+                    memory = Memory.from_snapshot(data, version)
+                    memory.checked_at = time.monotonic()
+                    self._sessions.set(session_id, memory)
+            elif self.backend.take_conflict(session_id):
+                # запись проиграла другому воркеру — его состояние в БД главнее
+                stored = self.backend.load(session_id)
+                memory = Memory.from_snapshot(stored[1], stored[0]) if stored else Memory()
+                memory.checked_at = time.monotonic()
+                self._sessions.set(session_id, memory)
+            elif time.monotonic() - memory.checked_at >= self.recheck:
+                version = self.backend.version(session_id)
+                if version is not None and version > memory.version:
+                    version, data = self.backend.load(session_id)
+                    memory = Memory.from_snapshot(data, version)
+                    self._sessions.set(session_id, memory)
+                memory.checked_at = time.monotonic()
+
+        if memory is None:
+            memory = Memory()
+            memory.checked_at = time.monotonic()
+            self._sessions.set(session_id, memory)
+        return memory
+
+    def peek(self, session_id: str) -> Optional[Memory]:
+        """Memory сессии из памяти процесса или None (без БД и без создания)"""
+        return self._sessions.get(session_id)
+
+    def save(self, session_id: str, memory: Memory):
+        """Поставить снапшот сессии в очередь на запись (не ждёт диска)"""
+        base_version = memory.version
+        memory.version += 1
+        memory.checked_at = time.monotonic()
+        if self.backend is not None:
+            self.backend.save(session_id, base_version, memory.version, memory.snapshot())
+
+    def drop(self, session_id: str):
+        self._sessions.pop(session_id)
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+
+    def __len__(self) -> int:
+        self._sessions.expire()
+        return len(self._sessions)
+
 
+# 🔑 ГЛОБАЛЬНОЕ ХРАНИЛИЩЕ СЕССИЙ - создаётся при импорте
+sessions = SessionStore(backend=SQLiteSessionBackend(SESSION_DB) if SESSION_DB else None)
 
-# 🔑 ГЛОБАЛЬНЫЙ ЭКЗЕМПЛЯР - создаётся при импорте
-memory = Memory()
+metrics.Gauge("active_sessions", "Сессии в памяти процесса (не истёкшие по TTL)", fn=lambda: len(sessions))
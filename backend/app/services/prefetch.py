@@ -0,0 +1,126 @@
+# app/services/prefetch.py
+#
+# Упреждающая подготовка следующей coding-задачи. Когда переход к новой
+# задаче становится вероятным (теория подходит к концу, кандидат запустил
+# код), задача выбирается заранее, а её короткое представление пишется
+# фоновым запросом к LLM — параллельно с ответом кандидата или прогоном
+# песочницы. Когда переход действительно случается, ответ собирается из
+# готового; если поток пошёл иначе, заготовка отбрасывается.
+
+import asyncio
+import os
+from typing import Optional
+
+from app.core import metrics
+from app.core.lru import LRUCache
+from app.services import llm
+from app.services.memory import SESSION_CAPACITY, Memory
+from app.services.tasks import get_task, sample_task
+
+# TASK_PREFETCH=0 — выключить упреждающую подготовку задач
+TASK_PREFETCH = os.getenv("TASK_PREFETCH", "1") != "0"
+# Сколько ждать представление, если оно ещё пишется (сек); потом — без него
+TASK_PREFETCH_WAIT = float(os.getenv("TASK_PREFETCH_WAIT", "1.5"))
+# Время жизни заготовки (сек)
+TASK_PREFETCH_TTL = float(os.getenv("TASK_PREFETCH_TTL", "900"))
+
+PRESENT_PROMPT = (
+    "Ты технический интервьюер. Кратко, в 1–2 предложениях, представь "
+    "кандидату следующую задачу live-coding: о чём она и на что обратить "
+    "внимание. Не давай решения, не пиши код и не повторяй условие дословно."
+)
+
+PREFETCH_OUTCOMES = metrics.Counter(
+    "task_prefetch_total", "Использование заготовленных задач", ("outcome",),
+)
+
+
+class Prefetched:
+    """Заготовка: задача и фоновая задача с её представлением"""
+
+    __slots__ = ("task_id", "level", "after", "job")
+
+    def __init__(self, task_id: str, level: int, after: Optional[str], job: asyncio.Task):
+        self.task_id = task_id
+        self.level = level
+        self.after = after  # задача, во время которой сделана заготовка
+        self.job = job
+
+    def valid_for(self, memory: Memory) -> bool:
+        return (
+            self.after == memory.current_task
+            and self.level == memory.coding_level
+            and self.task_id not in memory.seen_tasks
+        )
+
+
+def _cancel(_, entry: Prefetched):
+    entry.job.cancel()
+
+
+_entries = LRUCache(SESSION_CAPACITY, ttl=TASK_PREFETCH_TTL, sliding=False, on_evict=_cancel)
+
+
+async def present(task_id: str) -> str:
+    """Короткое вступление к задаче (пустая строка, если LLM недоступна)"""
+    task = get_task(task_id)
+    messages = [
+        {"role": "system", "content": PRESENT_PROMPT},
+        {"role": "user", "content": f"Задача: {task['description']}"},
+    ]
+    return (await llm.chat(
+        messages, max_tokens=200, temperature=0.7, stage="present", fallback=lambda: ""
+    )).strip()
+
+
+def start(session_id: str, memory: Memory):
+    """Подготовить следующую задачу в фоне (если ещё не подготовлена)"""
+    if not TASK_PREFETCH or memory.mode != "TECH":
+        return
+    entry = _entries.get(session_id)
+    if entry is not None and entry.valid_for(memory):
+        return
+
+    task_id = sample_task(memory.coding_level, exclude=memory.seen_tasks)
+    if task_id is None:
+        return
+    job = asyncio.get_running_loop().create_task(present(task_id))
+    _entries.set(session_id, Prefetched(task_id, memory.coding_level, memory.current_task, job))
+    if entry is not None:
+        entry.job.cancel()
+
+
+async def take(session_id: str, memory: Memory) -> Optional[tuple]:
+    """Забрать заготовку -> (task_id, вступление) или None, если её нет или она устарела"""
+    entry = _entries.pop(session_id)
+    if entry is None:
+        return None
+    if not entry.valid_for(memory):
+        entry.job.cancel()
+        PREFETCH_OUTCOMES.inc(outcome="stale")
+        return None
+
+    try:
+        intro = await asyncio.wait_for(asyncio.shield(entry.job), TASK_PREFETCH_WAIT)
+        PREFETCH_OUTCOMES.inc(outcome="hit")
+    except asyncio.TimeoutError:
+        # задача уже выбрана — не ждём вступление, отдаём без него
+        entry.job.cancel()
+        intro = ""
+        PREFETCH_OUTCOMES.inc(outcome="late")
+    except asyncio.CancelledError:
+        if not entry.job.cancelled():
+            raise  # отменили сам запрос, а не заготовку
+        intro = ""
+        PREFETCH_OUTCOMES.inc(outcome="hit")
+    except Exception:
+        intro = ""
+        PREFETCH_OUTCOMES.inc(outcome="hit")
+    return entry.task_id, intro
+
+
+def discard(session_id: str):
+    """Отбросить заготовку (интервью завершено или сброшено)"""
+    entry = _entries.pop(session_id)
+    if entry is not None:
+        entry.job.cancel()
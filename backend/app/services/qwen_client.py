@@ -1,23 +1,16 @@
 # app/services/qwen_client.py
 
-import os
-import re
-from typing import Optional
-from openai import OpenAI
+from typing import Callable, Optional
 
-from app.services.memory import memory  # ← ПРАВИЛЬНЫЙ ИМПОРТ
+from app.services import evaluation, handoff, llm, prefetch, summary
+from app.services.memory import Memory, sessions
+from app.core import tracing
 from app.core.prompts import build_system_prompt
-from app.services.tasks import get_task, random_task_by_level
+from app.services.complexity import slower_than
+from app.services.tasks import get_task, sample_task
 
 # ... остальной код
 
-
-API_KEY = os.getenv("API_KEY")
-BASE_URL = "https://llm.t1v.scibox.tech/"
-
-client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
-MODEL_NAME = "qwen3-coder-30b-a3b-instruct-fp8"
-
 # Маппинг уровней интервью
 LEVEL_NAMES = {
     1: "Junior",
@@ -26,56 +19,141 @@ LEVEL_NAMES = {
     4: "Expert"
 }
 
-def parse_coding_task(text: str) -> Optional[dict]:
-    if not text:
-        return None
-
-    task_id_match = re.search(r"task_id:\s*([\w\-]+)", text, re.IGNORECASE)
-    desc_match = re.search(
-        r"description:\s*([\s\S]*?)(?:template:|```python)", text, re.IGNORECASE
-    )
-    template_match = (
-        re.search(r"```python([\s\S]+?)```", text, re.IGNORECASE)
-        or re.search(r"```([\s\S]+?)```", text, re.IGNORECASE)
+# Заготовленные ответы на случай, когда LLM недоступна (см. llm.chat fallback)
+FALLBACK_THEORY_QUESTIONS = [
+    "Чем list отличается от tuple и когда что использовать?",
+    "Что такое генераторы и чем они полезны?",
+    "Как устроен dict в Python и какова сложность основных операций?",
+    "Как GIL влияет на многопоточные программы?",
+    "Чем asyncio отличается от потоков и процессов?",
+    "Что такое декоратор и как написать свой?",
+]
+FALLBACK_INTRO = "Давай начнём техническое интервью. Напиши «привет», чтобы выбрать уровень."
+FALLBACK_HINT = (
+    "Может, стоит ещё раз посмотреть на упавшие тесты: сравни свой результат "
+    "с ожидаемым и проверь граничные случаи — пустой вход и один элемент."
+)
+FALLBACK_ANSWER = "Спасибо! Расскажи, пожалуйста, подробнее — как бы ты применил это на практике?"
+
+
+def _fallback_theory(memory: Memory) -> str:
+    question = FALLBACK_THEORY_QUESTIONS[memory.theory_questions_asked % len(FALLBACK_THEORY_QUESTIONS)]
+    return f"Понял, спасибо. Следующий вопрос: {question}"
+
+
+def _fallback_feedback(memory: Memory, code_result: dict) -> str:
+    """Без LLM: при успехе — следующая задача из банка (в формате handoff)"""
+    if not code_result["success"]:
+        return FALLBACK_HINT
+    task_id = sample_task(memory.coding_level, exclude=memory.seen_tasks)
+    return f'{{"task_id": "{task_id}"}}\nОтлично, все тесты пройдены! Следующая задача.'
+
+
+def present_task(task_id: str, level: int, intro: str = "") -> str:
+    """Сообщение с условием задачи и шаблоном"""
+    task = get_task(task_id)
+    lead = f"{intro}\n\n" if intro else ""
+    return (
+        f"🎯 Задача уровня **Level {level}**:\n\n"
+        f"{lead}"
+        f"**{task['description']}**\n\n"
+        f"Ваш шаблон:\n"
+        f"```python\n{task['template']}\n```\n\n"
+        f"Напишите решение в редакторе слева."
     )
 
-    if not task_id_match:
-        return None
 
-    return {
-        "task_id": task_id_match.group(1).strip(),
-        "description": desc_match.group(1).strip() if desc_match else "",
-        "template": template_match.group(1).strip() if template_match else "",
-    }
+def _praise(code_result: dict) -> str:
+    """Короткий отзыв о решении, прошедшем все тесты"""
+    text = "Отлично, все тесты пройдены! ✅"
+    complexity = code_result.get("complexity") or {}
+    measured, expected = complexity.get("class"), complexity.get("expected")
+    if measured and expected:
+        if not slower_than(measured, expected):
+            text += f" По замерам сложность решения {measured} — как у оптимального."
+        else:
+            text += (
+                f" По замерам сложность решения {measured}, у оптимального — {expected}; "
+                "подумай, как её можно улучшить."
+            )
+    return text
 
-def make_final_report():
-    system_prompt = (
-        "Сформируй итоговое резюме технического интервью.\n\n"
-        "Формат строго такой:\n"
-        "**Теория:** X%\n"
-        "**Практика:** Y%\n"
-        "**Сильные стороны:**\n"
-        "— пункт 1\n"
-        "— пункт 2\n"
-        "**Зоны роста:**\n"
-        "— пункт 1\n"
-        "— пункт 2\n"
-        "**Вердикт:** <текст>\n"
-    )
 
-    messages = [{"role": "system", "content": system_prompt}]
-    messages.extend(memory.get_context())
+def _start_task(memory: Memory, task_id: str):
+    """Перевести интервью на новую задачу"""
+    memory.stage = "coding"
+    memory.current_task = task_id
+    memory.mark_task_seen(task_id)
+    memory.hint_count = 0
 
-    resp = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=messages,
-        max_tokens=900,
-        temperature=0.4,
-    )
 
-    return resp.choices[0].message.content
+def format_complexity(complexity: Optional[dict]) -> str:
+    """Замеры сложности из песочницы -> абзац для промпта"""
+    if not complexity or not complexity.get("timings"):
+        return ""
 
-async def ask_qwen(message: str, mode: str, code_result: Optional[dict] = None):
+    timings = ", ".join(
+        f"n={t['n']}: {t['wall_ms']:.3g} мс" for t in complexity["timings"]
+    )
+    lines = [f"Замеры времени решения: {timings}."]
+    if complexity.get("class"):
+        lines.append(
+            f"Эмпирическая сложность: {complexity['class']} "
+            f"(наклон log-log {complexity['slope']})."
+        )
+    if complexity.get("expected"):
+        lines.append(f"Ожидаемая сложность оптимального решения: {complexity['expected']}.")
+    lines.append(
+        "Оцени эффективность решения; O(n) и O(n log n) по замерам различимы плохо, "
+        "а вот отставание на целую степень n — повод обсудить оптимизацию."
+    )
+    return "\n".join(lines) + "\n\n"
+
+async def make_final_report(memory: Memory, session_id: str) -> str:
+    """Итоговый отчёт из оценки, накопленной по ходу интервью (без LLM)"""
+    with tracing.span("final_report", answers=len(memory.evaluation["theory"])):
+        # ответы, отправленные на оценку последними, могут быть ещё в работе
+        await evaluation.wait(session_id)
+        return evaluation.format_report(memory)
+
+async def ask_qwen(
+    message: str,
+    mode: str,
+    code_result: Optional[dict] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    *,
+    session_id: str,
+    on_task: Optional[Callable[[dict], None]] = None,
+):
+    """Один ход интервью -> {answer, next_task, is_final}.
+
+    on_token получает фрагменты ответа по мере генерации, on_task — следующую
+    задачу, как только она известна (раньше конца ответа).
+    """
+    memory = sessions.get(session_id)
+    try:
+        with tracing.span("ask_qwen", mode=mode, stage=memory.stage) as span:
+            turn = await _interview_turn(
+                memory, message, mode, code_result, on_token, on_task, session_id
+            )
+            span.set(next_stage=memory.stage)
+            return turn
+    finally:
+        # вытесненные из бюджета реплики сворачиваются в конспект в фоне
+        summary.schedule(session_id, memory)
+        # снапшот пишется в фоне — ход не ждёт диска
+        sessions.save(session_id, memory)
+
+
+async def _interview_turn(
+    memory: Memory,
+    message: str,
+    mode: str,
+    code_result: Optional[dict],
+    on_token: Optional[Callable[[str], None]],
+    on_task: Optional[Callable[[dict], None]],
+    session_id: str,
+):
     mode = (mode or "TECH").upper()
     memory.mode = mode
 
@@ -117,17 +195,15 @@ async def ask_qwen(message: str, mode: str, code_result: Optional[dict] = None):
             }
 
         # Иначе ответим как обычно в intro режиме
-        system_prompt = build_system_prompt("TECH")
+        system_prompt = build_system_prompt("TECH", "intro")
         messages = [{"role": "system", "content": system_prompt}]
         messages.extend(memory.get_context())
 
-        resp = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages,
-            max_tokens=500,
-            temperature=0.7,
+        # одинаковое начало диалога у разных кандидатов — ответ из кэша
+        answer = await llm.chat(
+            messages, max_tokens=500, temperature=0.7, on_token=on_token, cache=True,
+            mode=mode, stage="intro", fallback=lambda: FALLBACK_INTRO,
         )
-        answer = resp.choices[0].message.content
         memory.add_assistant_message(answer)
         return {"answer": answer, "next_task": None, "is_final": False}
 
@@ -163,47 +239,101 @@ async def ask_qwen(message: str, mode: str, code_result: Optional[dict] = None):
     # FEEDBACK — разбор тестов coding-задачи
     if memory.stage == "feedback" and code_result is not None:
         hint_count = getattr(memory, "hint_count", 0)
+        evaluation.record_code_run(memory, code_result)
+
+        # следующая задача подготовлена заранее (пока шли тесты): она сразу
+        # уходит в редактор, а LLM пишет только разбор решения
+        prefetched = await prefetch.take(session_id, memory) if code_result["success"] else None
+        prefetched_task = None
+        if prefetched:
+            prefetched_task = handoff.task_payload(prefetched[0])
+            if on_task is not None:
+                on_task(prefetched_task)
 
         tests_text = "\n".join(code_result["results"])
+        complexity_text = format_complexity(code_result.get("complexity"))
 
+        if prefetched:
+            instructions = (
+                "Все тесты пройдены. Кратко похвали и разбери решение: сложность, "
+                "качество кода, что можно улучшить.\n"
+                "Следующую задачу не выдавай и не пиши JSON — её покажет редактор.\n"
+            )
+        else:
+            instructions = (
+                "Если все тесты пройдены — кратко похвали и выдай следующую задачу.\n"
+                f"Эти задачи кандидат уже получал, не повторяй их: {', '.join(memory.seen_tasks) or 'нет'}.\n"
+                "Если есть ошибки — дай ОДНУ мягкую подсказку (начинай со слова 'Может...').\n"
+                "После двух неудачных попыток — заверши интервью и подготовь итоговый отчёт.\n"
+                f"{handoff.HANDOFF_INSTRUCTIONS}"
+            )
         full_msg = (
             "Вот результаты выполнения кода кандидата:\n\n"
             f"{tests_text}\n\n"
-            "Если все тесты пройдены — похвали и выдай следующую задачу строго в формате task_id/description/template.\n"
-            "Если есть ошибки — дай ОДНУ мягкую подсказку (начинай со слова 'Может...').\n"
-            "После двух неудачных попыток — заверши интервью и подготовь итоговый отчёт.\n"
+            f"{complexity_text}"
+            f"{instructions}"
         )
 
-        messages = [{"role": "system", "content": build_system_prompt("TECH")}]
+        messages = [{"role": "system", "content": build_system_prompt("TECH", "feedback")}]
         messages.extend(memory.get_context())
         messages.append({"role": "user", "content": full_msg})
 
-        resp = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages,
-            max_tokens=1200,
-            temperature=0.4,
+        # разбор зависит от задачи, результатов тестов и числа подсказок,
+        # а не от всей истории — одинаковые ошибки разбираются из кэша
+        complexity = code_result.get("complexity") or {}
+        # задача из заголовка ответа уходит в редактор, не дожидаясь конца ответа
+        parser = handoff.HandoffParser(
+            memory, accept_task=code_result["success"] and not prefetched,
+            on_text=on_token, on_task=on_task,
         )
-
-        answer = resp.choices[0].message.content
+        stream = on_token is not None or on_task is not None
+        raw = await llm.chat(
+            messages, max_tokens=1200, temperature=0.4, on_token=parser.feed if stream else None,
+            cache=True,
+            cache_scope=[
+                "feedback", memory.current_task, hint_count, code_result["results"],
+                complexity.get("class"), memory.seen_tasks, bool(prefetched),
+            ],
+            mode=mode, stage="feedback",
+            fallback=(
+                (lambda: _praise(code_result)) if prefetched
+                else (lambda: _fallback_feedback(memory, code_result))
+            ),
+        )
+        if not stream:
+            parser.feed(raw)
+        next_task = parser.finish() or prefetched_task
+
+        answer = parser.text.strip()
+        if prefetched:
+            block = present_task(prefetched[0], memory.coding_level, prefetched[1])
+            block = f"\n\n{block}" if answer else block
+            if on_token is not None:
+                on_token(block)
+            answer += block
+        elif next_task and not parser.legacy:
+            # условие и шаблон — из банка, а не из текста модели
+            block = present_task(next_task["task_id"], get_task(next_task["task_id"])["level"])
+            block = f"\n\n{block}" if answer else block
+            if on_token is not None:
+                on_token(block)
+            answer += block
         memory.add_assistant_message(answer)
 
-        parsed = parse_coding_task(answer)
-
-        if parsed:
-            memory.stage = "coding"
-            memory.current_task = parsed["task_id"]
-            memory.hint_count = 0
+        if next_task:
+            _start_task(memory, next_task["task_id"])
             return {
                 "answer": answer,
-                "next_task": parsed,
+                "next_task": next_task,
                 "is_final": False
             }
         else:
             memory.hint_count = hint_count + 1
 
         if memory.hint_count >= 2 and not code_result["success"]:
-            final_report = make_final_report()
+            evaluation.record_task_failed(memory)
+            prefetch.discard(session_id)
+            final_report = await make_final_report(memory, session_id)
             memory.add_assistant_message(final_report)
             memory.reset_full()
             return {
@@ -224,13 +354,10 @@ async def ask_qwen(message: str, mode: str, code_result: Optional[dict] = None):
         messages = [{"role": "system", "content": system_prompt}]
         messages.extend(memory.get_context())
 
-        resp = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages,
-            max_tokens=900,
-            temperature=0.7,
+        answer = await llm.chat(
+            messages, max_tokens=900, temperature=0.7, on_token=on_token,
+            mode=mode, stage=memory.stage, fallback=lambda: FALLBACK_ANSWER,
         )
-        answer = resp.choices[0].message.content
         memory.add_user_message(message)
         memory.add_assistant_message(answer)
         return {
@@ -241,12 +368,17 @@ async def ask_qwen(message: str, mode: str, code_result: Optional[dict] = None):
 
     # ТЕОРИЯ: анализ ответа
     if memory.stage == "theory":
+        # вопрос, на который отвечает кандидат, — последняя реплика интервьюера
+        question = next(
+            (m["content"] for m in reversed(memory.history) if m["role"] == "assistant"), ""
+        )
         memory.add_user_message(message)
         
         # Проверка, готов ли кандидат перейти к практике
         if message.lower() in ["да", "готов", "начать", "лайв-кодинг", "практика"]:
             if memory.theory_questions_asked >= 5:
                 memory.stage = "practice_confirm"
+                prefetch.start(session_id, memory)
                 response = (
                     "Отлично! Теоретическая часть завершена.\n\n"
                     "Переходим к практической части. Будете решать задачи в live-coding.\n"
@@ -262,24 +394,25 @@ async def ask_qwen(message: str, mode: str, code_result: Optional[dict] = None):
                 memory.add_assistant_message(response)
                 return {"answer": response, "next_task": None, "is_final": False}
 
+        # ответ оценивается в фоне и попадёт в итоговый отчёт
+        evaluation.record_theory_answer(session_id, memory, question, message)
+
         # Получить следующий теоретический вопрос
-        system_prompt = build_system_prompt("TECH")
+        system_prompt = build_system_prompt("TECH", "theory")
         messages = [{"role": "system", "content": system_prompt}]
         messages.extend(memory.get_context())
 
-        resp = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages,
-            max_tokens=800,
-            temperature=0.6,
+        answer = await llm.chat(
+            messages, max_tokens=800, temperature=0.6, on_token=on_token,
+            mode=mode, stage="theory", fallback=lambda: _fallback_theory(memory),
         )
-
-        answer = resp.choices[0].message.content
         memory.add_assistant_message(answer)
         memory.theory_questions_asked += 1
 
         # После 5 вопросов предлагаем переход к практике
         if memory.theory_questions_asked >= 5:
+            # практика близко — первая задача готовится, пока кандидат отвечает
+            prefetch.start(session_id, memory)
             answer = (
                 answer + "\n\n"
                 "---\n\n"
@@ -294,33 +427,22 @@ async def ask_qwen(message: str, mode: str, code_result: Optional[dict] = None):
         memory.add_user_message(message)
         
         if message.lower() in ["да", "готов", "ок", "поехали", "начать"]:
-            # Выбираем задачу по уровню кодинга
+            # Выбираем задачу по уровню кодинга (заготовленную, если есть)
             coding_level = memory.coding_level
-            task_id = random_task_by_level(coding_level)
+            prefetched = await prefetch.take(session_id, memory)
+            if prefetched:
+                task_id, intro = prefetched
+            else:
+                task_id, intro = sample_task(coding_level, exclude=memory.seen_tasks), ""
             
             if task_id:
-                task = get_task(task_id)
-                memory.stage = "coding"
-                memory.current_task = task_id
-                memory.hint_count = 0
-                
-                response = (
-                    f"🎯 Задача уровня **Level {coding_level}**:\n\n"
-                    f"**{task['description']}**\n\n"
-                    f"Ваш шаблон:\n"
-                    f"```python\n{task['template']}\n```\n\n"
-                    f"Напишите решение в редакторе слева."
-                )
-                
+                response = present_task(task_id, coding_level, intro)
+                _start_task(memory, task_id)
                 memory.add_assistant_message(response)
                 
                 return {
                     "answer": response,
-                    "next_task": {
-                        "task_id": task_id,
-                        "description": task['description'],
-                        "template": task['template']
-                    },
+                    "next_task": handoff.task_payload(task_id),
                     "is_final": False
                 }
 
@@ -342,13 +464,10 @@ async def ask_qwen(message: str, mode: str, code_result: Optional[dict] = None):
         messages = [{"role": "system", "content": system_prompt}]
         messages.extend(memory.get_context())
 
-        resp = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages,
-            max_tokens=900,
-            temperature=0.7,
+        answer = await llm.chat(
+            messages, max_tokens=900, temperature=0.7, on_token=on_token,
+            mode=mode, stage=memory.stage, fallback=lambda: FALLBACK_ANSWER,
         )
-        answer = resp.choices[0].message.content
         memory.add_assistant_message(answer)
         return {"answer": answer, "next_task": None, "is_final": False}
 
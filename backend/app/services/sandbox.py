@@ -1,11 +1,283 @@
+import os
 import tempfile
 import subprocess
 import sys
-import textwrap
+import time
+from app.core import metrics, tracing
+from app.services.complexity import fit_complexity
+from app.services.sandbox_pool import SandboxPoolError, pool
+from app.services.sandbox_protocol import (
+    FRAME_FORMAT,
+    RESULT_FD_ENV,
+    STATUS_ERROR,
+    STATUS_OK,
+    STATUS_TIMEOUT,
+    FailFast,
+    parse_frames,
+    parse_value,
+)
+from app.services.sandbox_zygote import MAX_OUTPUT, MAX_RESULTS, collect, reap_group
 from app.services.tasks import get_task
 
+# Лимит времени на один тест (сек)
+TEST_TIMEOUT = 3
 
-def run_in_sandbox(code: str, task_id: str):
+# Все тесты задачи в одном процессе: код кандидата загружается один раз.
+# SANDBOX_BATCH=0 возвращает старый режим «процесс на каждый тест».
+SANDBOX_BATCH = os.getenv("SANDBOX_BATCH", "1") != "0"
+
+# Шарды: тесты задачи раздаются нескольким процессам, форкнутым от процесса
+# с уже загруженным кодом кандидата. SANDBOX_SHARD_CPUS — сколько процессов
+# (ядер) может занять один запуск; по умолчанию ядра делятся поровну между
+# параллельными запусками планировщика, то есть шардов нет.
+SANDBOX_SHARD_CPUS = int(os.getenv(
+    "SANDBOX_SHARD_CPUS",
+    str(max(1, (os.cpu_count() or 1) // int(os.getenv("SANDBOX_CONCURRENCY", str(os.cpu_count() or 1))))),
+))
+# Меньше стольких тестов на шард не дробим: fork дороже пары быстрых тестов
+SANDBOX_SHARD_MIN_TESTS = int(os.getenv("SANDBOX_SHARD_MIN_TESTS", "16"))
+# Остановиться на первом упавшем тесте, остальные — «пропущены».
+# Для проверок «прошло всё или нет»; разбору ошибок нужны все результаты.
+SANDBOX_FAIL_FAST = os.getenv("SANDBOX_FAIL_FAST", "0") != "0"
+
+# Сколько символов stdout/stderr кандидата возвращать в ответе
+OUTPUT_LIMIT = 10_000
+
+# Замер сложности после прохождения тестов (SANDBOX_PROFILE=0 — выключить)
+SANDBOX_PROFILE = os.getenv("SANDBOX_PROFILE", "1") != "0"
+# Общий бюджет времени на замеры одного решения (сек)
+PROFILE_BUDGET = float(os.getenv("PROFILE_BUDGET", "2"))
+# Размеры входа: 64, 128, ... — рост прекращается, когда один вызов дольше лимита
+PROFILE_SIZES = [64 << i for i in range(12)]
+PROFILE_CALL_LIMIT = 0.2
+# Минимальное суммарное время повторов на одном n (сек) — для устойчивого минимума
+PROFILE_MIN_TIME = 0.01
+
+# Загрузчик для запуска без пула: скрипт читается из stdin целиком, после
+# чего stdin подменяется на /dev/null (input() кандидата получает EOF).
+_BOOTSTRAP = (
+    "import os, sys\n"
+    "source = sys.stdin.buffer.read()\n"
+    "fd = os.open(os.devnull, os.O_RDONLY)\n"
+    "os.dup2(fd, 0)\n"
+    "os.close(fd)\n"
+    "exec(compile(source, '<sandbox>', 'exec'), {'__name__': '__main__'})\n"
+)
+
+# Общее начало скриптов-обвязок: канал результатов (см. sandbox_protocol)
+# и таймаут через SIGALRM. stdout/stderr остаются за кандидатом.
+_PRELUDE = """
+import os
+import signal
+import struct
+import sys
+import time
+
+RESULT_FD = int(os.environ.pop({fd_env!r}))
+FRAME = struct.Struct({frame_format!r})
+STATUS_OK, STATUS_ERROR, STATUS_TIMEOUT = {statuses!r}
+
+class _TestTimeout(BaseException):
+    pass
+
+def _on_alarm(signum, frame):
+    raise _TestTimeout()
+
+# без setitimer (Windows) остаётся только общий таймаут процесса
+if hasattr(signal, "setitimer"):
+    signal.signal(signal.SIGALRM, _on_alarm)
+    def _arm(seconds):
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+else:
+    def _arm(seconds):
+        pass
+
+def _emit(index, status, wall=0.0, cpu=0.0, value="", type_name="", message=""):
+    value = value.encode("utf-8", "replace")
+    type_name = type_name.encode("utf-8", "replace")
+    message = message.encode("utf-8", "replace")
+    body = FRAME.size - 4 + len(value) + len(type_name) + len(message)
+    header = FRAME.pack(body, index, status, wall, cpu, len(value), len(type_name), len(message))
+    view = memoryview(header + value + type_name + message)
+    while view:
+        view = view[os.write(RESULT_FD, view):]
+"""
+
+# Проверка тестов. Код кандидата исполняется в отдельном namespace, каждое
+# выражение теста — со своим таймаутом.
+#
+# SHARDS > 1: после загрузки кода процесс форкает SHARDS потомков, тесты
+# раздаются через один (i % SHARDS) — дорогие тесты в конце списка делятся
+# поровну. Каждый шард пишет кадры в свой pipe, родитель пересылает их в
+# канал результатов целыми, поэтому кадры шардов не перемешиваются; порядок
+# восстанавливается по индексу теста.
+#
+# Ожидаемые значения не попадают ни в скрипт, ни в zygote, от которого
+# форкается потомок: код кандидата мог бы их прочитать. Fail-fast решает
+# приложение (sandbox_protocol.FailFast) — процесс убивается на первом
+# непрошедшем тесте, поэтому кадры шардов пересылаются в канал сразу, как
+# только пришли целиком.
+_HARNESS = _PRELUDE + """
+CODE = {code!r}
+EXPRS = {exprs!r}
+TIMEOUT = {timeout!r}
+SHARDS = {shards!r}
+
+namespace = {{"__name__": "__main__"}}
+try:
+    _arm(TIMEOUT)
+    try:
+        exec(compile(CODE, "<solution>", "exec"), namespace)
+    finally:
+        _arm(0)
+except _TestTimeout:
+    for i in range(len(EXPRS)):
+        _emit(i, STATUS_TIMEOUT)
+    sys.exit(0)
+except BaseException as e:
+    for i in range(len(EXPRS)):
+        _emit(i, STATUS_ERROR, type_name=type(e).__name__, message=str(e))
+    sys.exit(0)
+
+def _run_shard(indices):
+    for i in indices:
+        expr = EXPRS[i]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            _arm(TIMEOUT)
+            try:
+                result = eval(expr, namespace)
+            finally:
+                _arm(0)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            _emit(i, STATUS_OK, wall, cpu, repr(result), type(result).__name__)
+        except _TestTimeout:
+            _emit(i, STATUS_TIMEOUT, time.perf_counter() - wall, time.process_time() - cpu)
+        except BaseException as e:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            _emit(i, STATUS_ERROR, wall, cpu, type_name=type(e).__name__, message=str(e))
+
+"""
+
+# Конец обвязки без шардов
+_SINGLE = """
+_run_shard(range(len(EXPRS)))
+"""
+
+# Конец обвязки с шардами (компилируется только когда нужен)
+_SHARDED = """
+import selectors
+
+# длина целых кадров в начале буфера (хвост кадра ещё не дописан)
+def _whole_frames(buf):
+    end = 0
+    while end + 4 <= len(buf):
+        (body,) = struct.unpack_from("<I", buf, end)
+        if end + 4 + body > len(buf):
+            break
+        end += 4 + body
+    return end
+
+sys.stdout.flush()
+sys.stderr.flush()
+shards = {{}}  # fd чтения кадров -> pid шарда
+for k in range(SHARDS):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        for fd in shards:
+            os.close(fd)
+        os.close(RESULT_FD)
+        RESULT_FD = write_fd
+        try:
+            _run_shard(range(k, len(EXPRS), SHARDS))
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(0)
+    os.close(write_fd)
+    shards[read_fd] = pid
+
+buffers = {{fd: bytearray() for fd in shards}}
+sel = selectors.DefaultSelector()
+for fd in shards:
+    sel.register(fd, selectors.EVENT_READ)
+while sel.get_map():
+    for key, _ in sel.select():
+        chunk = os.read(key.fd, 65536)
+        if not chunk:
+            sel.unregister(key.fd)
+            os.close(key.fd)
+            os.waitpid(shards[key.fd], 0)
+            continue
+        buf = buffers[key.fd]
+        buf += chunk
+        end = _whole_frames(buf)
+        view = memoryview(bytes(buf[:end]))
+        del buf[:end]
+        while view:
+            view = view[os.write(RESULT_FD, view):]
+"""
+
+# Замер сложности. Входы строит генератор задачи, его время не учитывается.
+# На каждом n берётся минимум по повторам; кадр i — как у теста, value —
+# repr((n, число повторов)), type — "tuple". Рост n останавливается по лимиту одного вызова или общему бюджету.
+_PROFILE_HARNESS = _PRELUDE + """
+CODE = {code!r}
+CALL = {call!r}
+ARGS = {args!r}
+SIZES = {sizes!r}
+BUDGET = {budget!r}
+CALL_LIMIT = {call_limit!r}
+MIN_TIME = {min_time!r}
+
+namespace = {{"__name__": "__main__"}}
+deadline = time.perf_counter() + BUDGET
+try:
+    _arm(BUDGET)
+    try:
+        exec(compile(CODE, "<solution>", "exec"), namespace)
+        fn = namespace[CALL]
+        make_args = eval(ARGS, {{}})
+        for i, n in enumerate(SIZES):
+            calls, spent = 0, 0.0
+            best_wall = best_cpu = float("inf")
+            while calls < 3 or (spent < MIN_TIME and calls < 100):
+                args = make_args(n)
+                wall, cpu = time.perf_counter(), time.process_time()
+                fn(*args)
+                wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+                best_wall, best_cpu = min(best_wall, wall), min(best_cpu, cpu)
+                spent += wall
+                calls += 1
+                if wall > CALL_LIMIT:
+                    break
+            _emit(i, STATUS_OK, best_wall, best_cpu, repr((n, calls)), "tuple")
+            if best_wall > CALL_LIMIT or time.perf_counter() + 4 * spent > deadline:
+                break
+    finally:
+        _arm(0)
+except _TestTimeout:
+    pass
+except BaseException as e:
+    _emit(len(SIZES), STATUS_ERROR, type_name=type(e).__name__, message=str(e))
+"""
+
+
+def _format_result(expr, expected, actual):
+    if actual == expected:
+        return f"✓ {expr} → {actual}", True
+    return f"✗ {expr} → Ожидалось {expected}, получено {actual}", False
+
+
+def run_in_sandbox(
+    code: str,
+    task_id: str,
+    batch: bool = SANDBOX_BATCH,
+    profile: bool = SANDBOX_PROFILE,
+    fail_fast: bool = SANDBOX_FAIL_FAST,
+):
     task = get_task(task_id)
     if not task:
         return {
@@ -24,68 +296,264 @@ def run_in_sandbox(code: str, task_id: str):
             "llm_feedback": None,
         }
 
-    results = []
-    global_success = True
+    with tracing.span(
+        "sandbox.run", task_id=task_id, tests=len(tests), batch=batch, fail_fast=fail_fast
+    ) as span:
+        result = _run_and_check(code, task_id, tests, batch, fail_fast)
+        span.set(success=result["success"], timed_out=result["timed_out"], skipped=result["skipped"])
 
-    for test in tests:
-        expr = test["expr"]
-        expected = test["expected"]
+    # эффективность имеет смысл мерить только у правильного решения
+    if profile and result["success"] and task.get("profile"):
+        with tracing.span("sandbox.profile", task_id=task_id):
+            result["complexity"] = profile_solution(code, task["profile"])
 
-        with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
-            filename = f.name
-            script = f"""
-{code}
+    return result
 
-try:
-    result = eval({repr(expr)})
-    print("__RESULT__", repr(result))
-except Exception as e:
-    print("__ERROR__", str(e))
-"""
-            f.write(textwrap.dedent(script))
 
-        # --- SECURITY EXECUTION ---
-        proc = subprocess.Popen(
-            [sys.executable, filename],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+def _shard_count(tests: int) -> int:
+    """Сколько процессов дать тестам одного запуска (в пределах SANDBOX_SHARD_CPUS)"""
+    return max(1, min(SANDBOX_SHARD_CPUS, tests // SANDBOX_SHARD_MIN_TESTS))
+
+
+def _passed(test: dict, outcome: dict) -> bool:
+    return outcome["status"] == STATUS_OK and parse_value(outcome["value"]) == test["expected"]
+
+
+def _run_and_check(code: str, task_id: str, tests: list, batch: bool, fail_fast: bool = False) -> dict:
+    """Прогнать тесты и сравнить с ожидаемым -> результат run_in_sandbox"""
+    started = time.perf_counter()
+    # hung — тесты, чей процесс убит по общему таймауту
+    if batch:
+        outcomes, stdout, stderr, process_timed_out = _run_tests(
+            code, tests, fail_fast, _shard_count(len(tests))
         )
+        hung = set(range(len(tests))) if process_timed_out else set()
+    else:
+        outcomes, stdout, stderr, hung = {}, "", "", set()
+        for i, test in enumerate(tests):
+            single, out, err, process_timed_out = _run_tests(code, [test])
+            if 0 in single:
+                outcomes[i] = single[0]
+            elif process_timed_out:
+                hung.add(i)
+            stdout += out
+            stderr += err
+            if fail_fast and not (0 in single and _passed(test, single[0])):
+                break
+    metrics.SANDBOX_RUN.observe(time.perf_counter() - started, task_id=task_id)
 
-        try:
-            out, err = proc.communicate(timeout=3)
-        except subprocess.TimeoutExpired:
-            proc.kill()
+    results = []
+    details = []
+    global_success = True
+    timed_out = False
+    missing = []
+
+    for i, test in enumerate(tests):
+        expr = test["expr"]
+        outcome = outcomes.get(i)
+        detail = {"expr": expr, "expected": test["expected"]}
+
+        if outcome is None:
+            # зависание, выход процесса или fail-fast — станет ясно после остальных тестов
+            missing.append(i)
+            results.append(None)
+        elif outcome["status"] == STATUS_TIMEOUT:
             results.append(f"✗ {expr} → Превышено время выполнения")
+            detail["status"] = "timeout"
             global_success = False
-            continue
-
-        if "__ERROR__" in out:
-            error_msg = out.split("__ERROR__")[1].strip()
-            results.append(f"✗ {expr} → Ошибка: {error_msg}")
+            timed_out = True
+        elif outcome["status"] == STATUS_ERROR:
+            results.append(f"✗ {expr} → Ошибка: {outcome['message']}")
+            detail["status"] = "error"
+            detail["error_type"] = outcome["type"]
+            detail["error"] = outcome["message"]
             global_success = False
-            continue
-
-        if "__RESULT__" in out:
-            actual_str = out.split("__RESULT__")[1].strip()
-            try:
-                actual = eval(actual_str)
-            except:
-                actual = actual_str
         else:
-            results.append(f"✗ {expr} → Не удалось получить результат")
-            global_success = False
-            continue
+            line, ok = _format_result(expr, test["expected"], parse_value(outcome["value"]))
+            results.append(line)
+            detail["status"] = "passed" if ok else "failed"
+            detail["actual"] = outcome["value"]
+            detail["type"] = outcome["type"]
+            global_success = global_success and ok
+
+        if outcome is not None:
+            detail["wall_ms"] = round(outcome["wall"] * 1000, 3)
+            detail["cpu_ms"] = round(outcome["cpu"] * 1000, 3)
+        details.append(detail)
 
-        if actual == expected:
-            results.append(f"✓ {expr} → {actual}")
+    # при fail-fast до части тестов дело не дошло: исход уже решён другим тестом
+    skipped = fail_fast and not global_success
+    for i in missing:
+        expr = tests[i]["expr"]
+        if skipped:
+            results[i] = f"– {expr} → Пропущен: уже есть непрошедший тест"
+            details[i]["status"] = "skipped"
+        elif i in hung:
+            results[i] = f"✗ {expr} → Превышено время выполнения"
+            details[i]["status"] = "timeout"
+            timed_out = True
         else:
-            results.append(f"✗ {expr} → Ожидалось {expected}, получено {actual}")
-            global_success = False
+            # процесс завершился сам (sys.exit, os._exit, падение), не дойдя до теста
+            results[i] = f"✗ {expr} → Не удалось получить результат"
+            details[i]["status"] = "error"
+            details[i]["error"] = "процесс песочницы завершился до этого теста"
+    if missing:
+        global_success = False
+
+    if timed_out:
+        metrics.SANDBOX_TIMEOUTS.inc(task_id=task_id)
 
     return {
         "task": task_id,
         "success": global_success,
         "results": results,
         "llm_feedback": None,
+        "timed_out": timed_out,
+        "skipped": len(missing) if skipped else 0,
+        "tests": details,
+        "stdout": stdout[:OUTPUT_LIMIT],
+        "stderr": stderr[:OUTPUT_LIMIT],
+    }
+
+
+def profile_solution(code: str, spec: dict) -> dict:
+    """Замерить время решения на растущих n и подобрать класс сложности"""
+    script = _PROFILE_HARNESS.format(
+        fd_env=RESULT_FD_ENV,
+        frame_format=FRAME_FORMAT,
+        statuses=(STATUS_OK, STATUS_ERROR, STATUS_TIMEOUT),
+        code=code,
+        call=spec["call"],
+        args=spec["args"],
+        sizes=PROFILE_SIZES,
+        budget=PROFILE_BUDGET,
+        call_limit=PROFILE_CALL_LIMIT,
+        min_time=PROFILE_MIN_TIME,
+    )
+    _, _, frames, _ = _execute(script, PROFILE_BUDGET + TEST_TIMEOUT + 1)
+    outcomes = parse_frames(frames)
+
+    timings, sizes, walls = [], [], []
+    for i in range(len(PROFILE_SIZES)):
+        outcome = outcomes.get(i)
+        if outcome is None or outcome["status"] != STATUS_OK:
+            break
+        value = parse_value(outcome["value"])
+        if not (isinstance(value, tuple) and len(value) == 2):
+            break
+        n, calls = value
+        sizes.append(n)
+        walls.append(outcome["wall"])
+        timings.append({
+            "n": n,
+            "wall_ms": round(outcome["wall"] * 1000, 4),
+            "cpu_ms": round(outcome["cpu"] * 1000, 4),
+            "calls": calls,
+        })
+
+    fit = fit_complexity(sizes, walls) or {}
+
+    complexity = {
+        "class": fit.get("class"),
+        "expected": spec.get("expected"),
+        "slope": fit.get("slope"),
+        "timings": timings,
     }
+    error = outcomes.get(len(PROFILE_SIZES))
+    if error is not None:
+        complexity["error"] = f"{error['type']}: {error['message']}"
+    return complexity
+
+
+def _run_tests(code: str, tests: list, fail_fast: bool = False, shards: int = 1):
+    """Прогнать тесты в одном процессе (или shards форках от него).
+
+    -> ({индекс: outcome}, stdout, stderr, процесс убит по таймауту)
+    """
+    if shards > 1 and not hasattr(os, "fork"):
+        shards = 1
+    script = (_HARNESS + (_SHARDED if shards > 1 else _SINGLE)).format(
+        fd_env=RESULT_FD_ENV,
+        frame_format=FRAME_FORMAT,
+        statuses=(STATUS_OK, STATUS_ERROR, STATUS_TIMEOUT),
+        code=code,
+        exprs=[test["expr"] for test in tests],
+        timeout=TEST_TIMEOUT,
+        shards=shards,
+    )
+    stop = FailFast([test["expected"] for test in tests]) if fail_fast else None
+    # Span процесса: его длительность минус tests_wall_ms — старт
+    # интерпретатора (или fork от zygote) и загрузка кода кандидата.
+    # С шардами tests_wall_ms — сумма по шардам, она больше длительности.
+    with tracing.span("sandbox.process", tests=len(tests), shards=shards) as span:
+        # запас на загрузку кода кандидата и старт интерпретатора
+        out, err, frames, timed_out = _execute(script, TEST_TIMEOUT * (len(tests) + 1) + 1, stop)
+        outcomes = parse_frames(frames)
+        span.set(
+            timed_out=timed_out,
+            tests_wall_ms=round(sum(o["wall"] for o in outcomes.values()) * 1000, 3),
+        )
+    return outcomes, out.decode("utf-8", "replace"), err.decode("utf-8", "replace"), timed_out
+
+
+def _execute(script: str, timeout: float, stop=None):
+    """Исполнить скрипт в отдельном процессе -> (stdout, stderr, results, timed_out).
+
+    Если включён пул, потомок форкается от заранее запущенного zygote,
+    иначе стартует новый интерпретатор. В обоих случаях скрипт передаётся
+    через pipe, а временный рабочий каталог удаляется после запуска.
+    results — сырые байты канала результатов.
+    stop(results) — проверка по мере прихода кадров (FailFast): True —
+    процесс убивается. Решение принимается здесь, в приложении.
+    """
+    if pool.enabled:
+        try:
+            meta, (out, err, frames) = pool.run(script, timeout, stop)
+            tracing.annotate(runner="zygote")
+            return out, err, frames, meta["timed_out"]
+        except SandboxPoolError:
+            pass
+
+    tracing.annotate(runner="spawn")
+    with tempfile.TemporaryDirectory(prefix="sandbox-") as scratch:
+        return _spawn(script, scratch, timeout, stop)
+
+
+def _spawn(script: str, scratch: str, timeout: float, stop=None):
+    """Новый интерпретатор: скрипт по stdin, рабочий каталог — scratch"""
+    res_r, res_w = os.pipe()
+    try:
+        # --- SECURITY EXECUTION ---
+        proc = subprocess.Popen(
+            [sys.executable, "-I", "-c", _BOOTSTRAP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=scratch,
+            pass_fds=(res_w,),
+            env={**os.environ, RESULT_FD_ENV: str(res_w)},
+            start_new_session=True,
+        )
+    finally:
+        os.close(res_w)
+
+    try:
+        try:
+            proc.stdin.write(script.encode())
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass  # потомок уже умер — stderr расскажет почему
+        (out, err, frames), timed_out = collect(
+            [proc.stdout.fileno(), proc.stderr.fileno(), res_r],
+            [MAX_OUTPUT, MAX_OUTPUT, MAX_RESULTS],
+            timeout,
+            stop,
+        )
+    finally:
+        os.close(res_r)
+        reap_group(proc.pid)
+        proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    return out, err, frames, timed_out
@@ -0,0 +1,81 @@
+# app/services/sandbox_cache.py
+
+import ast
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, Optional
+
+from app.core.lru import LRUCache
+from app.services.tasks import get_task
+
+# Сколько результатов песочницы держать в памяти
+SANDBOX_CACHE_SIZE = int(os.getenv("SANDBOX_CACHE_SIZE", "2048"))
+
+
+def cache_key(code: str, task_id: str) -> Optional[str]:
+    """Хеш нормализованного кода + task_id + тестов и профиля задачи.
+
+    Код нормализуется через ast.dump, поэтому пробелы, пустые строки и
+    комментарии на ключ не влияют. Для неизвестной задачи — None.
+    """
+    task = get_task(task_id)
+    if not task:
+        return None
+
+    try:
+        normalized = ast.dump(ast.parse(code))
+    except (SyntaxError, ValueError):
+        normalized = code
+
+    h = hashlib.sha256()
+    h.update(normalized.encode())
+    h.update(b"\0" + task_id.encode() + b"\0")
+    h.update(repr(task.get("tests", [])).encode())
+    h.update(repr(task.get("profile")).encode())
+    return h.hexdigest()
+
+
+class SandboxCache:
+    """LRU-кэш результатов песочницы с single-flight.
+
+    Одинаковые одновременные запуски ждут один и тот же вычисляющийся
+    результат. Результаты с таймаутами не кэшируются: они зависят от
+    нагрузки, а не от кода.
+    """
+
+    def __init__(self, maxsize: int = SANDBOX_CACHE_SIZE):
+        self._results = LRUCache(maxsize)
+        self._inflight = {}  # key -> asyncio.Task
+
+    async def run(self, code: str, task_id: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        key = cache_key(code, task_id)
+        if key is None:
+            return await compute()
+
+        cached = self._results.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        job = self._inflight.get(key)
+        if job is None:
+            # отдельная задача: отмена первого запроса не ломает остальных
+            job = asyncio.ensure_future(compute())
+            self._inflight[key] = job
+            job.add_done_callback(lambda done: self._store(key, done))
+
+        return dict(await asyncio.shield(job))
+
+    def _store(self, key: str, job: asyncio.Task):
+        self._inflight.pop(key, None)
+        if job.cancelled() or job.exception() is not None:
+            return
+        result = job.result()
+        if not result.get("timed_out"):
+            self._results.set(key, result)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+
+sandbox_cache = SandboxCache()
@@ -0,0 +1,259 @@
+# app/services/sandbox_pool.py
+
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+
+from app.core import metrics
+from app.services import sandbox_zygote
+from app.services.sandbox_zygote import read_buffer, read_frame, write_frame
+
+# Размер пула zygote-процессов (0 — пул выключен, каждый запуск — новый python).
+# По умолчанию совпадает с лимитом параллельных запусков планировщика.
+SANDBOX_POOL_SIZE = int(os.getenv("SANDBOX_POOL_SIZE", os.getenv("SANDBOX_CONCURRENCY", str(os.cpu_count() or 1))))
+# Zygote перезапускается после стольких запусков
+SANDBOX_POOL_MAX_RUNS = int(os.getenv("SANDBOX_POOL_MAX_RUNS", "500"))
+# Период проверки простаивающих zygote (сек)
+SANDBOX_POOL_HEALTH_INTERVAL = float(os.getenv("SANDBOX_POOL_HEALTH_INTERVAL", "30"))
+# Сколько ждать свободный zygote (сек); дальше — запуск без пула
+SANDBOX_POOL_WAIT = float(os.getenv("SANDBOX_POOL_WAIT", "2"))
+
+SPAWN_FAILURES = metrics.Counter(
+    "sandbox_pool_spawn_failures_total", "Неудачные запуски zygote-процессов",
+)
+
+_ZYGOTE_PATH = sandbox_zygote.__file__
+
+
+class SandboxPoolError(Exception):
+    """Zygote не ответил — запуск стоит повторить без пула"""
+
+
+class _Zygote:
+    def __init__(self):
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, "-I", _ZYGOTE_PATH],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                bufsize=0,
+            )
+        except (OSError, ValueError) as e:
+            SPAWN_FAILURES.inc()
+            raise SandboxPoolError(f"zygote не запустился: {e}") from e
+        self.runs = 0
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, payload: dict, timeout: float) -> dict:
+        try:
+            write_frame(self.proc.stdin.fileno(), payload)
+            return self._reply(time.monotonic() + timeout)
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            raise SandboxPoolError(str(e)) from e
+
+    def _reply(self, deadline: float) -> dict:
+        ready, _, _ = select.select([self.proc.stdout], [], [], max(0.0, deadline - time.monotonic()))
+        if not ready:
+            raise SandboxPoolError("zygote не ответил вовремя")
+        return read_frame(self.proc.stdout.fileno())
+
+    def run(self, script: str, timeout: float, stop=None):
+        """-> (meta, [stdout, stderr, results]) — см. протокол в sandbox_zygote.
+
+        stop(results) — проверка канала результатов по мере прихода: True —
+        zygote получает cancel и убивает потомка. Решение принимается здесь,
+        в процессе приложения.
+        """
+        # zygote сам убивает потомка по таймауту, запас — на fork и ответ
+        deadline = time.monotonic() + timeout + 2
+        payload = {"op": "run", "script": script, "timeout": timeout, "stream": stop is not None}
+        fd = self.proc.stdout.fileno()
+        results = bytearray()
+        cancelled = False
+        try:
+            write_frame(self.proc.stdin.fileno(), payload)
+            while True:
+                frame = self._reply(deadline)
+                if "results" not in frame:
+                    break
+                results += read_buffer(fd, frame["results"])
+                if not cancelled and stop(results):
+                    write_frame(self.proc.stdin.fileno(), {"op": "cancel"})
+                    cancelled = True
+            out, err, rest = [read_buffer(fd, size) for size in frame["sizes"]]
+        # TypeError/ValueError — в том числе от json.dumps запроса: запуск
+        # уйдёт в новый интерпретатор, а zygote пул заменит
+        except (OSError, EOFError, ValueError, TypeError, KeyError) as e:
+            raise SandboxPoolError(str(e)) from e
+        results += rest
+        return frame, [out, err, results]
+
+    def ping(self, timeout: float = 1.0) -> bool:
+        try:
+            return self.request({"op": "ping"}, timeout).get("pong") is True
+        except SandboxPoolError:
+            return False
+
+    def close(self):
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+
+
+class SandboxPool:
+    """Пул заранее запущенных zygote-процессов.
+
+    Каждый запуск берёт свободный zygote, тот форкает чистого потомка под
+    скрипт. Zygote перезапускается после max_runs запусков, а фоновый поток
+    раз в health_interval секунд пингует простаивающие и заменяет мёртвые.
+
+    Если zygote не удалось запустить, слот считается пропавшим и
+    восстанавливается фоновым потоком; запуск, которому не досталось
+    zygote, получает SandboxPoolError и идёт без пула.
+    """
+
+    def __init__(
+        self,
+        size: int = SANDBOX_POOL_SIZE,
+        max_runs: int = SANDBOX_POOL_MAX_RUNS,
+        health_interval: float = SANDBOX_POOL_HEALTH_INTERVAL,
+        wait: float = SANDBOX_POOL_WAIT,
+    ):
+        self.size = size
+        self.max_runs = max_runs
+        self.health_interval = health_interval
+        self.wait = wait
+        self._missing = 0  # слоты без zygote (запуск не удался), под _lock
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and hasattr(os, "fork")
+
+    def start(self):
+        with self._lock:
+            if self._started or not self.enabled:
+                return
+            self._started = True
+            self._closed.clear()
+        for _ in range(self.size):
+            self._spawn()
+        threading.Thread(target=self._health_loop, name="sandbox-pool-health", daemon=True).start()
+
+    def run(self, script: str, timeout: float, stop=None):
+        """Исполнить скрипт в свежем потомке zygote -> (meta, buffers).
+
+        stop — условие fail-fast (см. _Zygote.run).
+        """
+        self.start()
+        if self._missing >= self.size:
+            raise SandboxPoolError("ни одного zygote не запущено")
+        try:
+            zygote = self._idle.get(timeout=self.wait)
+        except queue.Empty:
+            raise SandboxPoolError("нет свободного zygote") from None
+        if not zygote.alive():
+            zygote.close()
+            try:
+                zygote = _Zygote()
+            except SandboxPoolError:
+                self._lose()
+                raise
+
+        try:
+            result = zygote.run(script, timeout, stop)
+        except SandboxPoolError:
+            zygote.close()
+            self._respawn()
+            raise
+
+        zygote.runs += 1
+        if self._closed.is_set():
+            zygote.close()
+        elif zygote.runs >= self.max_runs:
+            zygote.close()
+            self._respawn()
+        else:
+            self._idle.put(zygote)
+        return result
+
+    def _spawn(self) -> bool:
+        """Запустить zygote в свободный слот; при неудаче слот — пропавший"""
+        try:
+            zygote = _Zygote()
+        except SandboxPoolError:
+            self._lose()
+            return False
+        self._idle.put(zygote)
+        return True
+
+    def _lose(self):
+        with self._lock:
+            self._missing += 1
+
+    def _refill(self):
+        """Повторить запуск zygote для пропавших слотов"""
+        with self._lock:
+            missing, self._missing = self._missing, 0
+        for _ in range(missing):
+            if self._closed.is_set():
+                return
+            self._spawn()
+
+    def _respawn(self):
+        """Заменить zygote в фоне, чтобы запрос не ждал старта процесса"""
+        def spawn():
+            if not self._closed.is_set():
+                self._spawn()
+        threading.Thread(target=spawn, daemon=True).start()
+
+    def check_health(self):
+        """Пропинговать простаивающие zygote, мёртвые заменить"""
+        for _ in range(self._idle.qsize()):
+            try:
+                zygote = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if zygote.alive() and zygote.ping():
+                self._idle.put(zygote)
+            else:
+                zygote.close()
+                self._spawn()
+        self._refill()
+
+    def _health_loop(self):
+        while not self._closed.wait(self.health_interval):
+            self.check_health()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size if self.enabled else 0,
+            "idle": self._idle.qsize(),
+            "missing": self._missing,
+        }
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._started = False
+            self._missing = 0
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+pool = SandboxPool()
@@ -0,0 +1,106 @@
+# app/services/sandbox_protocol.py
+#
+# Канал результатов песочницы: потомок пишет в отдельный pipe (fd из
+# переменной SANDBOX_RESULT_FD) по одному кадру на тест:
+#
+#   <I  длина тела кадра (всё после этого поля)
+#   <I  индекс теста
+#   <B  статус (STATUS_OK / STATUS_ERROR / STATUS_TIMEOUT)
+#   <d  wall time теста, сек
+#   <d  CPU time теста, сек
+#   <I  длина repr значения
+#   <I  длина имени типа (значения или исключения)
+#   <I  длина сообщения исключения
+#   ... сами байты repr, имени типа и сообщения (utf-8)
+#
+# stdout/stderr остаются целиком за кандидатом.
+
+import ast
+import struct
+
+# Номер fd канала передаётся потомку в окружении; zygote не зависит от
+# app.* и задаёт имя переменной сам
+from app.services.sandbox_zygote import RESULT_FD_ENV
+
+FRAME_FORMAT = "<IIBddIII"
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_TIMEOUT = 2
+
+FRAME = struct.Struct(FRAME_FORMAT)
+
+
+def parse_value(text: str):
+    """repr значения -> значение (только литералы, без eval)"""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return text
+
+
+class FailFast:
+    """Условие остановки прогона на первом непрошедшем тесте (stop для collect).
+
+    Разбирает кадры канала результатов по мере прихода и сравнивает
+    значение с ожидаемым так же, как это делает проверка тестов. Живёт
+    только в процессе приложения: ни песочница, ни zygote, от которого она
+    форкается, ожидаемых значений не видят.
+    """
+
+    def __init__(self, expected: list):
+        self.expected = expected
+        self.offset = 0
+
+    def __call__(self, buf) -> bool:
+        while self.offset + FRAME.size <= len(buf):
+            body_len, index, status, _, _, n_value, _, _ = FRAME.unpack_from(buf, self.offset)
+            end = self.offset + 4 + body_len
+            if end > len(buf):
+                break
+            if status != STATUS_OK or index >= len(self.expected):
+                return True
+            start = self.offset + FRAME.size
+            value = bytes(buf[start:start + n_value]).decode("utf-8", "replace")
+            if parse_value(value) != self.expected[index]:
+                return True
+            self.offset = end
+        return False
+
+
+def parse_frames(buf) -> dict:
+    """Разобрать кадры из буфера -> {индекс теста: outcome}.
+
+    Заголовки читаются через struct.unpack_from прямо из memoryview, строки
+    декодируются из срезов без промежуточных копий bytes. Разбор
+    останавливается на первом битом кадре.
+    """
+    mv = memoryview(buf)
+    size = len(mv)
+    offset = 0
+    outcomes = {}
+
+    while offset + FRAME.size <= size:
+        body_len, index, status, wall, cpu, n_value, n_type, n_message = FRAME.unpack_from(mv, offset)
+        end = offset + 4 + body_len
+        if body_len != FRAME.size - 4 + n_value + n_type + n_message or end > size:
+            break
+
+        pos = offset + FRAME.size
+        value = str(mv[pos:pos + n_value], "utf-8", "replace")
+        pos += n_value
+        type_name = str(mv[pos:pos + n_type], "utf-8", "replace")
+        pos += n_type
+        message = str(mv[pos:pos + n_message], "utf-8", "replace")
+
+        outcomes[index] = {
+            "status": status,
+            "value": value,
+            "type": type_name,
+            "message": message,
+            "wall": wall,
+            "cpu": cpu,
+        }
+        offset = end
+
+    mv.release()
+    return outcomes
@@ -0,0 +1,144 @@
+# app/services/sandbox_scheduler.py
+
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core import metrics
+
+# Сколько песочниц выполняется одновременно (по умолчанию — по числу CPU)
+SANDBOX_CONCURRENCY = int(os.getenv("SANDBOX_CONCURRENCY", str(os.cpu_count() or 1)))
+# Сколько запусков может ждать в очереди, дальше — отказ с 429
+SANDBOX_QUEUE_LIMIT = int(os.getenv("SANDBOX_QUEUE_LIMIT", str(4 * SANDBOX_CONCURRENCY)))
+
+
+class SandboxBusy(Exception):
+    """Очередь песочницы заполнена"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"sandbox queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SandboxScheduler:
+    """Асинхронный запуск песочницы с ограничением параллелизма.
+
+    Не больше concurrency запусков выполняются одновременно (в пуле потоков,
+    event loop не блокируется), не больше queue_limit ждут. Ожидающие
+    обслуживаются по кругу между сессиями, чтобы один кандидат с серией
+    запусков не задерживал остальных. Всё состояние меняется только из
+    event loop, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, concurrency: int = SANDBOX_CONCURRENCY, queue_limit: int = SANDBOX_QUEUE_LIMIT):
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sandbox")
+        self._running = 0
+        self._queued = 0
+        self._waiting = OrderedDict()  # session_id -> deque[Future]
+        # скользящее среднее длительности запуска — для Retry-After
+        self._avg_run = 0.5
+
+    async def run(self, session_id: str, fn, *args):
+        """Выполнить fn(*args) в потоке, дождавшись своей очереди"""
+        queued_at = time.monotonic()
+        await self._acquire(session_id)
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        metrics.SANDBOX_QUEUE_WAIT.observe(started - queued_at)
+        try:
+            # контекст (текущий span трассировки) переносится в поток
+            job = self._executor.submit(contextvars.copy_context().run, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+
+        # Слот освобождается, когда поток действительно закончил: отмена
+        # запроса (клиент ушёл) не останавливает уже запущенную песочницу.
+        def on_done(_):
+            try:
+                loop.call_soon_threadsafe(self._finish, started)
+            except RuntimeError:
+                pass  # event loop уже закрыт
+
+        job.add_done_callback(on_done)
+        return await asyncio.wrap_future(job, loop=loop)
+
+    def _finish(self, started: float):
+        self._avg_run = 0.9 * self._avg_run + 0.1 * (time.monotonic() - started)
+        self._release()
+
+    async def _acquire(self, session_id: str):
+        if self._running < self.concurrency and self._queued == 0:
+            self._running += 1
+            return
+
+        if self._queued >= self.queue_limit:
+            raise SandboxBusy(self.retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session_id, deque()).append(fut)
+        self._queued += 1
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # слот уже выдан, но запрос отменили — вернуть его
+                self._release()
+            else:
+                self._forget(session_id, fut)
+            raise
+
+    def _release(self):
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._running < self.concurrency and self._waiting:
+            session_id, waiters = next(iter(self._waiting.items()))
+            fut = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                # round-robin: сессия уходит в конец очереди сессий
+                self._waiting.move_to_end(session_id)
+            else:
+                del self._waiting[session_id]
+            if not fut.done():
+                self._running += 1
+                fut.set_result(None)
+
+    def _forget(self, session_id: str, fut: asyncio.Future):
+        waiters = self._waiting.get(session_id)
+        if waiters is None or fut not in waiters:
+            return
+        waiters.remove(fut)
+        self._queued -= 1
+        if not waiters:
+            del self._waiting[session_id]
+
+    def retry_after(self) -> int:
+        """Оценка, через сколько секунд стоит повторить запрос"""
+        return max(1, math.ceil(self._avg_run * (self._queued + 1) / self.concurrency))
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "sessions_waiting": len(self._waiting),
+            "concurrency": self.concurrency,
+            "queue_limit": self.queue_limit,
+        }
+
+
+scheduler = SandboxScheduler()
+
+metrics.Gauge("sandbox_running", "Запуски песочницы, выполняющиеся сейчас", fn=lambda: scheduler.stats()["running"])
+metrics.Gauge("sandbox_queued", "Запуски песочницы, ждущие слота", fn=lambda: scheduler.stats()["queued"])
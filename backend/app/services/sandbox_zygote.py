@@ -0,0 +1,280 @@
+# app/services/sandbox_zygote.py
+#
+# Fork-server для песочницы. Запускается отдельным процессом
+# (python sandbox_zygote.py), заранее импортирует типичные модули и на каждый
+# запрос форкает чистого потомка, который исполняет присланный скрипт.
+# Сам zygote код кандидата не исполняет, поэтому его состояние не портится.
+# Скрипт приходит по pipe и на диск не пишется; рабочий каталог потомка —
+# временный scratch, он удаляется после каждого запуска.
+#
+# Модуль не зависит от app.*: родитель импортирует отсюда только функции
+# кадрирования.
+#
+# Протокол по stdin/stdout zygote: кадр = 4 байта длины (big-endian) + JSON.
+#   {"op": "run", "script": str, "timeout": float, "stream": bool} ->
+#       {"returncode": int, "timed_out": bool, "sizes": [out, err, results]}
+#       и следом сырые байты stdout, stderr и канала результатов
+#       (см. sandbox_protocol) указанных размеров.
+#       stream=true — канал результатов пересылается по мере прихода:
+#       {"results": int} и следом столько байт; в итоговом кадре остаётся
+#       только непереданный хвост. Пока идёт прогон, родитель может
+#       прислать {"op": "cancel"} — потомок убивается (fail-fast решает
+#       родитель: ожидаемые значения в zygote не попадают, иначе потомок
+#       прочитал бы их из унаследованной памяти).
+#   {"op": "cancel"} вне прогона игнорируется (опоздал к уже законченному)
+#   {"op": "ping"} -> {"pong": true, "runs": int}
+
+import json
+import os
+import selectors
+import shutil
+import signal
+import struct
+import sys
+import tempfile
+import time
+
+_HEADER = struct.Struct(">I")
+
+# Сколько вывода кандидата сохраняем (остальное читается и отбрасывается)
+MAX_OUTPUT = 1 << 20
+# Лимит канала результатов
+MAX_RESULTS = 16 << 20
+
+# Переменная окружения с номером fd канала результатов (см. sandbox_protocol)
+RESULT_FD_ENV = "SANDBOX_RESULT_FD"
+
+# Модули, которые обычно нужны решениям: импортируются один раз в zygote
+# и достаются потомкам уже загруженными.
+PRELOAD = (
+    "collections", "heapq", "bisect", "itertools", "functools", "math",
+    "re", "string", "typing", "dataclasses", "json", "random", "traceback",
+)
+
+
+def read_exact(fd: int, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = os.read(fd, size)
+        if not chunk:
+            raise EOFError("pipe closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_buffer(fd: int, size: int) -> bytearray:
+    """Прочитать ровно size байт сразу в bytearray (без склейки кусков)"""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = os.readv(fd, [view[pos:]])
+        if not n:
+            raise EOFError("pipe closed")
+        pos += n
+    view.release()
+    return buf
+
+
+def read_frame(fd: int) -> dict:
+    (size,) = _HEADER.unpack(read_exact(fd, _HEADER.size))
+    return json.loads(read_exact(fd, size))
+
+
+def write_all(fd: int, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def write_frame(fd: int, payload: dict):
+    data = json.dumps(payload).encode()
+    write_all(fd, _HEADER.pack(len(data)) + data)
+
+
+def collect(fds: list, limits: list, timeout: float, stop=None, cancel_fd=None):
+    """Читать pipe'ы до EOF на всех или до дедлайна -> (буферы, timed_out).
+
+    stop(буфер) вызывается после каждого куска из последнего pipe (канала
+    результатов); True — прекратить чтение, процесс больше не нужен.
+    cancel_fd стал читаемым — тоже прекратить (сам fd не читается).
+    """
+    buffers = {fd: bytearray() for fd in fds}
+    caps = dict(zip(fds, limits))
+    sel = selectors.DefaultSelector()
+    for fd in fds:
+        sel.register(fd, selectors.EVENT_READ)
+    if cancel_fd is not None:
+        sel.register(cancel_fd, selectors.EVENT_READ)
+
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    while len(sel.get_map()) > (cancel_fd is not None):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in sel.select(remaining):
+            if key.fd == cancel_fd:
+                sel.close()
+                return [buffers[fd] for fd in fds], False
+            chunk = os.read(key.fd, 65536)
+            if not chunk:
+                sel.unregister(key.fd)
+                continue
+            buf = buffers[key.fd]
+            room = caps[key.fd] - len(buf)
+            if room > 0:
+                buf += chunk[:room]
+            if stop is not None and key.fd == fds[-1] and stop(buf):
+                sel.close()
+                return [buffers[fd] for fd in fds], False
+    sel.close()
+    return [buffers[fd] for fd in fds], timed_out
+
+
+def reap_group(pid: int):
+    """Добить группу процессов потомка (в т.ч. оставленные им фоновые)"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _child(script: str, scratch: str, out_w: int, err_w: int, res_w: int):
+    """Потомок: перенаправить stdio, перейти в scratch и исполнить скрипт"""
+    status = 0
+    try:
+        os.setsid()
+        os.chdir(scratch)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        for fd in (devnull, out_w, err_w):
+            os.close(fd)
+        os.environ[RESULT_FD_ENV] = str(res_w)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        exec(compile(script, "<sandbox>", "exec"), {"__name__": "__main__"})
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        status = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(status)
+
+
+def _run(script: str, timeout: float, control=None):
+    scratch = tempfile.mkdtemp(prefix="sandbox-")
+    try:
+        return _run_in(script, scratch, timeout, control)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+class _Forward:
+    """stop для collect: пересылать новые байты канала результатов родителю"""
+
+    def __init__(self, control_out: int):
+        self.control_out = control_out
+        self.sent = 0
+
+    def __call__(self, buf) -> bool:
+        if len(buf) > self.sent:
+            write_frame(self.control_out, {"results": len(buf) - self.sent})
+            write_all(self.control_out, buf[self.sent:])
+            self.sent = len(buf)
+        return False
+
+
+def _run_in(script: str, scratch: str, timeout: float, control=None):
+    """control=(control_in, control_out) — потоковый режим (см. протокол)"""
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    res_r, res_w = os.pipe()
+    # буферы zygote не должны продублироваться в потомке
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    pid = os.fork()
+    if pid == 0:
+        for fd in (out_r, err_r, res_r):
+            os.close(fd)
+        _child(script, scratch, out_w, err_w, res_w)
+
+    for fd in (out_w, err_w, res_w):
+        os.close(fd)
+    forward = _Forward(control[1]) if control is not None else None
+    try:
+        buffers, timed_out = collect(
+            [out_r, err_r, res_r], [MAX_OUTPUT, MAX_OUTPUT, MAX_RESULTS], timeout,
+            forward, control[0] if control is not None else None,
+        )
+    finally:
+        for fd in (out_r, err_r, res_r):
+            os.close(fd)
+
+    # Группа убивается и после нормального выхода: фоновые процессы кандидата
+    # не должны пережить запуск и писать в scratch. Пока потомок не собран
+    # waitpid, его pid (и номер группы) не может достаться другому процессу.
+    reap_group(pid)
+    if timed_out:
+        try:
+            # потомок мог не успеть сделать setsid
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    _, status = os.waitpid(pid, 0)
+
+    if forward is not None:
+        del buffers[2][:forward.sent]
+    meta = {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timed_out": timed_out,
+        "sizes": [len(buf) for buf in buffers],
+    }
+    return meta, buffers
+
+
+def main():
+    # Ctrl+C в терминале uvicorn не должен ронять zygote раньше родителя
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name in PRELOAD:
+        __import__(name)
+
+    # управляющий канал — сырые fd 0/1, без буферов sys.stdin/stdout
+    control_in, control_out = 0, 1
+    runs = 0
+    while True:
+        try:
+            request = read_frame(control_in)
+        except EOFError:
+            return
+
+        op = request.get("op")
+        if op == "ping":
+            write_frame(control_out, {"pong": True, "runs": runs})
+            continue
+        if op == "cancel":
+            continue
+        if op != "run":
+            return
+
+        runs += 1
+        control = (control_in, control_out) if request.get("stream") else None
+        meta, buffers = _run(request["script"], float(request["timeout"]), control)
+        write_frame(control_out, meta)
+        for buf in buffers:
+            write_all(control_out, buf)
+
+
+if __name__ == "__main__":
+    main()
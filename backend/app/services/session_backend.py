@@ -0,0 +1,192 @@
+# app/services/session_backend.py
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.core import metrics
+
+CONFLICTS = metrics.Counter(
+    "session_write_conflicts_total",
+    "Снапшоты сессий, не записанные из-за более новой записи другого воркера",
+)
+
+
+class SQLiteSessionBackend:
+    """Хранилище снапшотов Memory в SQLite (WAL) с отложенной записью.
+
+    save() только кладёт снапшот в очередь — запись в БД делает фоновый
+    поток пачками, одной транзакцией на пачку, так что ход интервью не ждёт
+    диска. Для одной сессии в очереди держится только последний снапшот.
+
+    Каждый снапшот несёт монотонную версию: несколько воркеров могут делить
+    один файл БД, а воркер перечитывает сессию, если в БД версия новее.
+    Запись — compare-and-set от версии, с которой воркер начинал ход: если
+    в БД к этому времени другая версия (тот же ход параллельно обработал
+    другой воркер), снапшот не пишется, а сессия помечается конфликтной —
+    её нужно перечитать (take_conflict).
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.05, retention: float = 7 * 24 * 3600):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending = {}  # session_id -> (base_version, version, data)
+        self._conflicts = set()  # session_id, под _lock
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " version INTEGER NOT NULL,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - retention,))
+        conn.commit()
+        conn.close()
+
+        self._writer = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        # в WAL-режиме synchronous=NORMAL не делает fsync на каждый commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # -------------------------------
+    # чтение
+    # -------------------------------
+
+    def load(self, session_id: str) -> Optional[tuple]:
+        """(version, snapshot) последнего сохранённого состояния или None"""
+        with self._lock:
+            pending = self._pending.get(session_id)
+        if pending is not None:
+            _, version, data = pending
+            return version, json.loads(data)
+
+        row = self._reader().execute(
+            "SELECT version, data FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def version(self, session_id: str) -> Optional[int]:
+        """Версия сессии в БД (без учёта ещё не записанных снапшотов)"""
+        row = self._reader().execute(
+            "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    # -------------------------------
+    # запись
+    # -------------------------------
+
+    def save(self, session_id: str, base_version: int, version: int, snapshot: dict):
+        """Записать снапшот version поверх base_version (версии, которую воркер прочитал)"""
+        data = json.dumps(snapshot, ensure_ascii=False)
+        with self._lock:
+            pending = self._pending.get(session_id)
+            if pending is not None:
+                # предыдущий снапшот ещё не записан — в БД по-прежнему его база
+                base_version = pending[0]
+            self._pending[session_id] = (base_version, version, data)
+        self._wake.set()
+
+    def take_conflict(self, session_id: str) -> bool:
+        """Запись сессии проиграла другому воркеру (флаг сбрасывается)"""
+        if not self._conflicts:
+            return False
+        with self._lock:
+            if session_id not in self._conflicts:
+                return False
+            self._conflicts.discard(session_id)
+            return True
+
+    def _flush(self):
+        """Записать накопленные снапшоты одной транзакцией"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+
+        now = time.time()
+        conn = self._writer_conn
+        conflicts = []
+        conn.execute("BEGIN")
+        try:
+            for sid, (base_version, version, data) in batch.items():
+                updated = conn.execute(
+                    "UPDATE sessions SET version = ?, data = ?, updated_at = ?"
+                    " WHERE session_id = ? AND version = ?",
+                    (version, data, now, sid, base_version),
+                ).rowcount
+                if not updated:
+                    # новой сессии (или удалённой по retention) в БД нет
+                    updated = conn.execute(
+                        "INSERT INTO sessions (session_id, version, data, updated_at)"
+                        " VALUES (?, ?, ?, ?) ON CONFLICT(session_id) DO NOTHING",
+                        (sid, version, data, now),
+                    ).rowcount
+                if not updated:
+                    conflicts.append(sid)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            # вернуть пачку в очередь; у более свежих снапшотов база — из пачки
+            with self._lock:
+                for sid, item in batch.items():
+                    newer = self._pending.get(sid)
+                    self._pending[sid] = item if newer is None else (item[0],) + newer[1:]
+            raise
+
+        if conflicts:
+            CONFLICTS.inc(len(conflicts))
+            with self._lock:
+                for sid in conflicts:
+                    # снапшоты, сделанные поверх проигравшего, тоже устарели
+                    self._pending.pop(sid, None)
+                    self._conflicts.add(sid)
+
+    def _run(self):
+        self._writer_conn = self._connect()
+        while True:
+            self._wake.wait()
+            closed = self._closed
+            # короткая пауза, чтобы собрать в пачку записи соседних запросов
+            if not closed:
+                time.sleep(self.flush_interval)
+            self._wake.clear()
+            try:
+                self._flush()
+            except sqlite3.Error:
+                if not closed:
+                    time.sleep(self.flush_interval)
+                    self._wake.set()
+            if closed:
+                break
+        self._writer_conn.close()
+
+    def close(self):
+        """Остановить фоновую запись, дописав очередь"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer.join(timeout=10)
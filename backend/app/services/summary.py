@@ -0,0 +1,111 @@
+# app/services/summary.py
+#
+# Скользящее краткое содержание интервью. Сообщения, вытесненные из
+# токен-бюджета истории (Memory.evicted), после хода сворачиваются в
+# Memory.summary фоновым запросом к LLM — ответ кандидату этого не ждёт.
+
+import asyncio
+import os
+
+from app.services import llm
+from app.services.memory import Memory, sessions
+
+# Ограничение на длину краткого содержания (в токенах ответа LLM)
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+# Если LLM недоступна и вытесненного накопилось больше — сворачиваем без неё
+SUMMARY_MAX_PENDING = int(os.getenv("SUMMARY_MAX_PENDING", "24"))
+
+SUMMARY_PROMPT = (
+    "Ты ведёшь краткий конспект технического интервью для интервьюера.\n"
+    "Обнови конспект с учётом новых реплик. Сохрани: уровень кандидата, "
+    "заданные вопросы и качество ответов, выданные задачи и их результат, "
+    "заметные сильные и слабые стороны. Пиши сжато, пунктами, без вступлений, "
+    "не длиннее 10 пунктов."
+)
+
+_ROLE_NAMES = {"user": "Кандидат", "assistant": "Интервьюер"}
+
+_tasks = {}  # session_id -> asyncio.Task
+
+
+def _transcript(messages: list) -> str:
+    return "\n\n".join(
+        f"{_ROLE_NAMES.get(m['role'], m['role'])}: {m['content']}" for m in messages
+    )
+
+
+async def summarize(previous: str, messages: list) -> str:
+    """Свернуть новые реплики в краткое содержание"""
+    prompt = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"Текущий конспект:\n{previous or '(пусто)'}\n\n"
+                f"Новые реплики:\n{_transcript(messages)}"
+            ),
+        },
+    ]
+    answer = await llm.chat(
+        prompt, max_tokens=SUMMARY_MAX_TOKENS, temperature=0.2, stage="summary"
+    )
+    return answer.strip()
+
+
+def _fold_locally(memory: Memory):
+    """Запасной вариант без LLM: первые строки реплик"""
+    lines = [
+        f"— {_ROLE_NAMES.get(m['role'], m['role'])}: {m['content'].strip().splitlines()[0][:120]}"
+        for m in memory.evicted
+        if m["content"].strip()
+    ]
+    memory.summary = "\n".join(filter(None, [memory.summary] + lines))
+    memory.evicted = []
+
+
+async def _update(session_id: str, memory: Memory):
+    batch = list(memory.evicted)
+    try:
+        summary = await summarize(memory.summary, batch)
+    except Exception:
+        summary = None
+
+    # за время запроса сессию могли сбросить или перечитать из БД
+    if sessions.peek(session_id) is not memory or memory.evicted[: len(batch)] != batch:
+        return
+
+    if summary:
+        memory.summary = summary
+        del memory.evicted[: len(batch)]
+    elif len(memory.evicted) > SUMMARY_MAX_PENDING:
+        _fold_locally(memory)
+    else:
+        return
+    sessions.save(session_id, memory)
+
+
+def schedule(session_id: str, memory: Memory):
+    """Запустить фоновое обновление, если есть что сворачивать"""
+    if not memory.evicted:
+        return
+    running = _tasks.get(session_id)
+    if running is not None and not running.done():
+        return  # вытесненное подхватит следующий ход
+
+    task = asyncio.get_running_loop().create_task(_update(session_id, memory))
+    _tasks[session_id] = task
+
+    def forget(_):
+        if _tasks.get(session_id) is task:
+            del _tasks[session_id]
+
+    task.add_done_callback(forget)
+
+
+async def close():
+    """Отменить незавершённые обновления (при остановке приложения)"""
+    pending = list(_tasks.values())
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    _tasks.clear()
@@ -1,207 +1,219 @@
+# app/services/tasks.py
+#
+# Банк задач хранится на диске (app/data/tasks):
+#   index.json      — список метаданных: task_id, level, title, description
+#                     и необязательный weight; читается целиком при старте
+#   <task_id>.json  — template, tests и необязательный profile; читается
+#                     при первом обращении к задаче и держится в LRU
+# Изменения файлов подхватываются без рестарта (проверка mtime не чаще
+# раза в TASKS_RELOAD_INTERVAL секунд).
+
+import json
+import os
 import random
-
-TASKS = {
-    # ---------- LEVEL 1 ----------
-    "reverse_string": {
-        "level": 1,
-        "title": "Reverse String",
-        "description": "Развернуть строку.",
-        "template": "def reverse(s):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": 'reverse("abc")', "expected": "cba"},
-            {"expr": 'reverse("hello")', "expected": "olleh"},
-            {"expr": 'reverse("")', "expected": ""},
-            {"expr": 'reverse("racecar")', "expected": "racecar"},
-        ],
-    },
-
-    "sum_array": {
-        "level": 1,
-        "title": "Sum Array",
-        "description": "Посчитать сумму чисел в массиве.",
-        "template": "def sum_array(a):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "sum_array([1,2,3])", "expected": 6},
-            {"expr": "sum_array([-1,1,0])", "expected": 0},
-            {"expr": "sum_array([])", "expected": 0},
-        ],
-    },
-
-    "is_palindrome": {
-        "level": 1,
-        "title": "Palindrome Check",
-        "description": "Проверить, является ли строка палиндромом.",
-        "template": "def is_palindrome(s):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": 'is_palindrome("aba")', "expected": True},
-            {"expr": 'is_palindrome("abc")', "expected": False},
-            {"expr": 'is_palindrome("")', "expected": True},
-        ],
-    },
-
-    "count_vowels": {
-        "level": 1,
-        "title": "Count Vowels",
-        "description": "Посчитать количество гласных в строке.",
-        "template": "def count_vowels(s):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": 'count_vowels("hello")', "expected": 2},
-            {"expr": 'count_vowels("xyz")', "expected": 0},
-            {"expr": 'count_vowels("")', "expected": 0},
-        ],
-    },
-
-    "max_of_three": {
-        "level": 1,
-        "title": "Max of Three",
-        "description": "Вернуть максимум из трёх чисел.",
-        "template": "def max_of_three(a, b, c):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "max_of_three(1,5,2)", "expected": 5},
-            {"expr": "max_of_three(7,7,7)", "expected": 7},
-            {"expr": "max_of_three(-1,-5,0)", "expected": 0},
-        ],
-    },
-
-    # ---------- LEVEL 2 ----------
-    "validate_parentheses": {
-        "level": 2,
-        "title": "Validate Parentheses",
-        "description": "Проверить корректность скобочной строки.",
-        "template": "def is_valid(s):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": 'is_valid("()")', "expected": True},
-            {"expr": 'is_valid("([])")', "expected": True},
-            {"expr": 'is_valid("([)]")', "expected": False},
-        ],
-    },
-
-    "two_sum": {
-        "level": 2,
-        "title": "Two Sum",
-        "description": "Найти индексы двух чисел, сумма которых равна target.",
-        "template": "def two_sum(nums, target):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "two_sum([2,7,11,15], 9)", "expected": [0,1]},
-            {"expr": "two_sum([3,2,4], 6)", "expected": [1,2]},
-        ],
-    },
-
-    "remove_duplicates": {
-        "level": 2,
-        "title": "Remove Duplicates",
-        "description": "Удалить дубликаты из отсортированного массива.",
-        "template": "def remove_duplicates(arr):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "remove_duplicates([1,1,2])", "expected": [1,2]},
-            {"expr": "remove_duplicates([])", "expected": []},
-        ],
-    },
-
-    "rotate_array": {
-        "level": 2,
-        "title": "Rotate Array",
-        "description": "Повернуть массив на k шагов вправо.",
-        "template": "def rotate(arr, k):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "rotate([1,2,3,4,5], 2)", "expected": [4,5,1,2,3]},
-            {"expr": "rotate([1,2], 3)", "expected": [2,1]},
-        ],
-    },
-
-    "longest_common_prefix": {
-        "level": 2,
-        "title": "Longest Common Prefix",
-        "description": "Найти самый длинный общий префикс.",
-        "template": "def lcp(arr):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "lcp(['flower','flow','flight'])", "expected": "fl"},
-            {"expr": "lcp(['dog','racecar','car'])", "expected": ""},
-        ],
-    },
-
-    # ---------- LEVEL 3 ----------
-    "flatten_list": {
-        "level": 3,
-        "title": "Flatten List",
-        "description": "Развернуть вложенный список.",
-        "template": "def flatten(arr):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "flatten([1,[2,[3],4]])", "expected": [1,2,3,4]},
-            {"expr": "flatten([])", "expected": []},
-        ],
-    },
-
-    "max_subarray": {
-        "level": 3,
-        "title": "Max Subarray",
-        "description": "Максимальная сумма подмассива (Kadane).",
-        "template": "def max_subarray(arr):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "max_subarray([-2,1,-3,4,-1,2,1,-5,4])", "expected": 6},
-            {"expr": "max_subarray([1,2,3])", "expected": 6},
-        ],
-    },
-
-    "top_k": {
-        "level": 3,
-        "title": "Top K Frequent",
-        "description": "Найти K самых частых элементов.",
-        "template": "def top_k(nums, k):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "top_k([1,1,1,2,2,3], 2)", "expected": [1,2]},
-            {"expr": "top_k([4,4,4,4], 1)", "expected": [4]},
-        ],
-    },
-
-    "merge_intervals": {
-        "level": 3,
-        "title": "Merge Intervals",
-        "description": "Объединить пересекающиеся интервалы.",
-        "template": "def merge(intervals):\n    # ваш код здесь\n    pass",
-        "tests": [
-            {"expr": "merge([[1,3],[2,6],[8,10],[15,18]])", "expected": [[1,6],[8,10],[15,18]]},
-            {"expr": "merge([[1,4],[4,5]])", "expected": [[1,5]]},
-        ],
-    },
-
-    # ---------- LEVEL 4 ----------
-    "lru_cache": {
-        "level": 4,
-        "title": "LRU Cache",
-        "description": "Реализовать LRU-кэш.",
-        "template": (
-            "class LRUCache:\n"
-            "    def __init__(self, capacity):\n"
-            "        pass\n"
-            "\n"
-            "    def get(self, key):\n"
-            "        pass\n"
-            "\n"
-            "    def put(self, key, value):\n"
-            "        pass\n"
-        ),
-        "tests": [],
-    },
-
-    "trie": {
-        "level": 4,
-        "title": "Trie",
-        "description": "Реализовать Trie.",
-        "template": (
-            "class Trie:\n"
-            "    def __init__(self):\n"
-            "        pass\n"
-            "\n"
-            "    def insert(self, word):\n"
-            "        pass\n"
-            "\n"
-            "    def search(self, word):\n"
-            "        pass\n"
-        ),
-        "tests": [],
-    },
-}
+import threading
+import time
+
+from app.core.lru import LRUCache
+
+TASKS_DIR = os.getenv("TASKS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "tasks"))
+# Сколько загруженных задач (шаблоны и тесты) держать в памяти
+TASKS_CACHE_SIZE = int(os.getenv("TASKS_CACHE_SIZE", "256"))
+# Период проверки файлов на изменения (сек); 0 — без горячей перезагрузки
+TASKS_RELOAD_INTERVAL = float(os.getenv("TASKS_RELOAD_INTERVAL", "2"))
+
+# Сколько раз пробуем таблицу, прежде чем отбирать неувиденные задачи явно
+SAMPLE_ATTEMPTS = 8
+
+
+class AliasTable:
+    """Взвешенный выбор за O(1) (метод Уолкера).
+
+    Таблица строится один раз за O(n); каждый выбор — одно случайное число
+    и одно сравнение. Отрицательный вес — ValueError; если все веса нулевые,
+    выбор равномерный.
+    """
+
+    def __init__(self, items: list, weights: list):
+        if any(w < 0 for w in weights):
+            raise ValueError("вес задачи не может быть отрицательным")
+        n = len(items)
+        total = float(sum(weights))
+        if total == 0:
+            weights = [1.0] * n
+            total = float(n)
+        self.items = list(items)
+        self.weights = dict(zip(items, weights))
+        self._prob = [0.0] * n
+        self._alias = [0] * n
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self._prob[i] = 1.0
+
+    def sample(self, rng=random):
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self._prob[i] else self.items[self._alias[i]]
+
+
+class _Index:
+    """Неизменяемый снимок index.json: метаданные, уровни, таблицы выбора"""
+
+    def __init__(self, entries: list, mtime: int):
+        self.mtime = mtime
+        self.meta = {entry["task_id"]: entry for entry in entries}
+        self.ids = list(self.meta)
+        self.by_level = {}
+        for tid, entry in self.meta.items():
+            self.by_level.setdefault(entry["level"], []).append(tid)
+        # ключ None — все задачи
+        groups = {**self.by_level, None: self.ids}
+        self.tables = {
+            level: AliasTable(tids, [self.meta[tid].get("weight", 1.0) for tid in tids])
+            for level, tids in groups.items()
+            if tids
+        }
+
+
+class TaskBank:
+    """Ленивый банк задач с горячей перезагрузкой.
+
+    Метаданные всех задач в памяти, шаблоны и тесты — только для
+    использованных задач (LRU). Перезагрузка подменяет снимок индекса
+    целиком, поэтому читатели без блокировок видят либо старый, либо новый.
+    """
+
+    def __init__(
+        self,
+        root: str = TASKS_DIR,
+        cache_size: int = TASKS_CACHE_SIZE,
+        reload_interval: float = TASKS_RELOAD_INTERVAL,
+    ):
+        self.root = root
+        self.reload_interval = reload_interval
+        self._payloads = LRUCache(cache_size)  # task_id -> [payload, mtime, checked_at]
+        self._reload_lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._index = self._read_index()
+
+    # ---------- файлы ----------
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, "index.json")
+
+    def _payload_path(self, task_id: str) -> str:
+        return os.path.join(self.root, f"{task_id}.json")
+
+    def _read_index(self) -> _Index:
+        path = self._index_path()
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, encoding="utf-8") as f:
+            return _Index(json.load(f), mtime)
+
+    def _read_payload(self, task_id: str):
+        path = self._payload_path(task_id)
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, encoding="utf-8") as f:
+            return json.load(f), mtime
+
+    def _due(self, checked_at: float, now: float) -> bool:
+        return self.reload_interval > 0 and now - checked_at >= self.reload_interval
+
+    def _refresh(self) -> _Index:
+        """Перечитать index.json, если он изменился (не чаще reload_interval)"""
+        index = self._index
+        now = time.monotonic()
+        if not self._due(self._checked_at, now) or not self._reload_lock.acquire(blocking=False):
+            return index
+        try:
+            self._checked_at = now
+            if os.stat(self._index_path()).st_mtime_ns != index.mtime:
+                self._index = index = self._read_index()
+        except (OSError, ValueError, KeyError):
+            pass  # файл пишется прямо сейчас или битый — остаёмся на старом
+        finally:
+            self._reload_lock.release()
+        return index
+
+    # ---------- API ----------
+
+    def get(self, task_id: str):
+        """Задача целиком (метаданные + шаблон и тесты) или None"""
+        meta = self._refresh().meta.get(task_id)
+        if meta is None:
+            return None
+
+        now = time.monotonic()
+        entry = self._payloads.get(task_id)
+        if entry is not None and self._due(entry[2], now):
+            entry[2] = now
+            try:
+                if os.stat(self._payload_path(task_id)).st_mtime_ns != entry[1]:
+                    entry = None
+            except OSError:
+                pass
+        if entry is None:
+            try:
+                payload, mtime = self._read_payload(task_id)
+            except (OSError, ValueError):
+                return None
+            entry = [payload, mtime, now]
+            self._payloads.set(task_id, entry)
+
+        return {**meta, **entry[0]}
+
+    def meta(self, task_id: str):
+        """Только метаданные задачи (без чтения файла задачи)"""
+        return self._refresh().meta.get(task_id)
+
+    def page(self, offset: int = 0, limit: int = 50) -> list:
+        index = self._refresh()
+        return [index.meta[tid] for tid in index.ids[offset:offset + limit]]
+
+    def sample(self, level=None, exclude=(), rng=random):
+        """Случайная задача уровня (None — любого) с учётом весов.
+
+        Задачи из exclude (уже показанные сессии) не выдаются, пока на уровне
+        есть другие; когда всё показано — повторы разрешены.
+        """
+        table = self._refresh().tables.get(level)
+        if table is None:
+            return None
+
+        for _ in range(SAMPLE_ATTEMPTS):
+            tid = table.sample(rng)
+            if tid not in exclude:
+                return tid
+
+        # почти всё показано: выбираем явно из оставшихся
+        remaining = [tid for tid in table.items if tid not in exclude]
+        if not remaining:
+            return table.sample(rng)
+        weights = [table.weights[tid] for tid in remaining]
+        if not any(weights):
+            return rng.choice(remaining)  # у оставшихся нулевой вес
+        return rng.choices(remaining, weights)[0]
+
+    @property
+    def by_level(self) -> dict:
+        return self._refresh().by_level
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._refresh().meta
+
+    def __len__(self) -> int:
+        return len(self._refresh().ids)
+
+
+bank = TaskBank()
 
 
 # -------------------------------
@@ -209,13 +221,16 @@ TASKS = {
 # -------------------------------
 
 def get_task(task_id):
-    return TASKS.get(task_id)
+    return bank.get(task_id)
+
+
+def sample_task(level=None, exclude=(), rng=random):
+    return bank.sample(level, exclude, rng)
 
 
 def random_task():
-    return random.choice(list(TASKS.keys()))
+    return bank.sample()
 
 
 def random_task_by_level(level: int):
-    tasks = [tid for tid, t in TASKS.items() if t["level"] == level]
-    return random.choice(tasks) if tasks else None
+    return bank.sample(level)
@@ -0,0 +1,162 @@
+# bench/load.py
+#
+# Нагрузочный прогон бэкенда синтетическими кандидатами.
+#
+#   cd backend && python -m scripts.stub_llm --port 9999 &
+#   API_KEY=stub LLM_BASE_URL=http://127.0.0.1:9999/ uvicorn app.main:app --port 8000 &
+#   python -m bench.load --candidates 50 --rounds 2 --tasks 2
+#
+# Каждый кандидат — отдельная сессия (X-Session-Id): intro → level_select →
+# theory → practice_confirm → coding → /code/run (правильное решение или,
+# с вероятностью --fail-rate, сломанное) и дальше по выданным задачам.
+# В конце — пропускная способность и p50/p95/p99 по каждому шагу;
+# --json печатает то же одной JSON-строкой.
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from bench.solutions import SOLUTIONS
+
+THEORY_ANSWER = (
+    "Изменяемые типы (list, dict, set) можно менять на месте, неизменяемые "
+    "(int, str, tuple) — нет; поэтому неизменяемые годятся в ключи словаря."
+)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, step: str, seconds: float, ok: bool):
+        self.latencies[step].append(seconds)
+        if not ok:
+            self.errors[step] += 1
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    return statistics.quantiles(ordered, n=100, method="inclusive")[int(q) - 1]
+
+
+class Candidate:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, args):
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.headers = {"X-Session-Id": uuid.uuid4().hex}
+
+    async def post(self, step: str, path: str, payload: dict):
+        started = time.perf_counter()
+        ok = False
+        try:
+            resp = await self.client.post(path, json=payload, headers=self.headers)
+            ok = resp.status_code == 200
+            return resp.json() if ok else None
+        except httpx.HTTPError:
+            return None
+        finally:
+            self.stats.record(step, time.perf_counter() - started, ok)
+
+    async def chat(self, step: str, message: str):
+        data = await self.post(f"chat:{step}", "/chat/", {"message": message, "mode": "TECH"})
+        return (data or {}).get("answer") or {}
+
+    async def run(self):
+        await self.post("reset", "/reset/", {})
+        await self.chat("intro", "привет")
+        await self.chat("level_select", str(random.randint(1, 3)))
+        # после выбора уровня задан 1-й вопрос; ещё 4 ответа, потом «да»
+        for _ in range(4):
+            await self.chat("theory", THEORY_ANSWER)
+        await self.chat("theory", "да")
+        turn = await self.chat("practice_confirm", "да")
+
+        task = turn.get("next_task")
+        for _ in range(self.args.tasks):
+            if not task:
+                return
+            task_id = task["task_id"]
+            code = SOLUTIONS.get(task_id, task.get("template") or "pass")
+            if random.random() < self.args.fail_rate:
+                code = task.get("template") or "pass"
+            result = await self.post("code/run", "/code/run", {"code": code, "task_id": task_id})
+            if not result or result.get("is_final"):
+                return
+            task = result.get("next_task")
+
+
+def report(stats: Stats, elapsed: float, candidates: int) -> dict:
+    steps = {}
+    for step, values in sorted(stats.latencies.items()):
+        steps[step] = {
+            "count": len(values),
+            "errors": stats.errors[step],
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+        }
+    total = sum(s["count"] for s in steps.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "candidates": candidates,
+        "candidates_per_s": round(candidates / elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 2),
+        "steps": steps,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон интервью")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--candidates", type=int, default=20, help="одновременных кандидатов")
+    parser.add_argument("--rounds", type=int, default=1, help="интервью на каждого кандидата")
+    parser.add_argument("--tasks", type=int, default=2, help="задач на интервью")
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.candidates, max_keepalive_connections=args.candidates)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def candidate():
+            for _ in range(args.rounds):
+                await Candidate(client, stats, args).run()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(candidate() for _ in range(args.candidates)))
+        elapsed = time.perf_counter() - started
+
+    result = report(stats, elapsed, args.candidates * args.rounds)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    print(
+        f"{result['candidates']} interviews in {result['elapsed_s']}s  "
+        f"({result['candidates_per_s']} interviews/s, {result['rps']} req/s)"
+    )
+    print(f"{'step':<24} {'count':>6} {'err':>4} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for step, s in result["steps"].items():
+        print(
+            f"{step:<24} {s['count']:>6} {s['errors']:>4} {s['rps']:>7} "
+            f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
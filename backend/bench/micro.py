@@ -0,0 +1,284 @@
+# bench/micro.py
+#
+# Микробенчмарки горячих путей бэкенда — того, через что проходит каждый
+# ход интервью. Работают офлайн: без LLM и без запущенного сервера.
+#
+#   cd backend && python -m bench.micro                  # таблица + сравнение с baselines.json
+#   python -m bench.micro --json > results.json          # машиночитаемый вывод
+#   python -m bench.micro --filter sandbox --check       # код 1 при регрессии
+#   python -m bench.micro --update                       # переписать baselines.json
+#
+# Каждый бенчмарк калибруется как timeit: число вызовов подбирается так,
+# чтобы один повтор шёл не меньше --min-time, затем --repeat повторов.
+# В отчёт идут минимум и медиана времени одного вызова (нс). С базовой
+# линией сравнивается минимум: регрессия — если он больше baseline в
+# --tolerance раз.
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from itertools import cycle
+
+from bench.solutions import SOLUTIONS
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# Ответы модели стадии feedback, на которых гоняется разбор handoff
+LLM_OUTPUTS = {
+    "json": (
+        '{"task_id": "merge_intervals"}\n'
+        "Хорошая работа — решение корректное и укладывается в O(n). "
+        "Давай усложним: следующая задача на интервалы."
+    ),
+    "json_repair": (
+        "```json\n{'task_id': 'Merge-Intervalz'}\n```\n"
+        "Хорошая работа — решение корректное и укладывается в O(n)."
+    ),
+    "legacy": (
+        "Отлично, все тесты пройдены! Следующая задача.\n\n"
+        "task_id: two_sum\n"
+        "description: Дан массив nums и число target. Верни индексы двух "
+        "элементов, сумма которых равна target.\n"
+        "template:\n```python\ndef two_sum(nums, target):\n    pass\n```"
+    ),
+    "legacy_prose": (
+        "Хорошая работа — решение корректное и укладывается в O(n).\n"
+        "Давай усложним. Возьмём задачу на интервалы, она часто встречается "
+        "в реальных системах бронирования и календарях.\n\n"
+        "task_id: merge_intervals\n"
+        "description: Дан список интервалов [start, end]. Объедини все "
+        "пересекающиеся интервалы и верни результат, отсортированный по началу.\n"
+        "Подумай о сортировке и о том, как сравнивать соседние интервалы.\n\n"
+        "```python\ndef merge(intervals):\n    # твой код здесь\n    pass\n```\n\n"
+        "Когда будешь готов — нажми «Запустить»."
+    ),
+    "hint": (
+        "Может, стоит проверить граничные случаи — пустую строку и строку "
+        "из одного символа? Посмотри, что возвращает функция в этих случаях."
+    ),
+    "theory": (
+        "Хороший ответ. А как в Python устроен словарь и какова сложность "
+        "вставки и поиска в среднем и в худшем случае?\n" * 4
+    ),
+}
+
+THEORY_ANSWER = (
+    "Словарь — хеш-таблица с открытой адресацией; поиск и вставка в среднем "
+    "O(1), в худшем O(n) при коллизиях. Ключи должны быть хешируемыми. "
+) * 3
+
+
+def measure(fn, min_time: float, repeat: int) -> dict:
+    """Калибровка и замер fn() -> минимум/медиана нс на вызов"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 24:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - started) / number * 1e9)
+    return {
+        "ns_per_op": round(min(runs)),
+        "median_ns": round(statistics.median(runs)),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+# ---------- бенчмарки: имя -> фабрика, возвращающая вызываемый замер ----------
+
+def _sandbox_level(level: int):
+    from app.services.sandbox import run_in_sandbox
+    from app.services.sandbox_pool import pool
+    from app.services.tasks import bank
+
+    pool.start()
+    submissions = cycle(
+        [(SOLUTIONS.get(tid, bank.get(tid)["template"]), tid) for tid in bank.by_level[level]]
+    )
+    run_in_sandbox(*next(submissions), profile=False)  # прогрев zygote и импортов
+
+    def run():
+        code, task_id = next(submissions)
+        result = run_in_sandbox(code, task_id, profile=False)
+        assert result["success"], result["results"]
+
+    return run
+
+
+def _handoff(name: str):
+    from app.services.handoff import HandoffParser
+    from app.services.memory import Memory
+
+    memory = Memory()
+    memory.coding_level = 2
+    memory.mark_task_seen("two_sum")
+    # ответ приходит потоком — фрагментами по несколько символов, как токены
+    text = LLM_OUTPUTS[name]
+    chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def run():
+        parser = HandoffParser(memory)
+        for chunk in chunks:
+            parser.feed(chunk)
+        parser.finish()
+
+    return run
+
+
+def _prompts():
+    from app.core.prompts import PROMPTS, build_system_prompt
+
+    keys = list(PROMPTS)
+
+    def run():
+        for mode, stage in keys:
+            build_system_prompt(mode, stage)
+
+    return run
+
+
+def _memory_add(history: int):
+    from app.services.memory import Memory
+
+    memory = Memory()
+    memory.stage = "theory"
+    for _ in range(history):
+        memory.add_user_message(THEORY_ANSWER)
+    memory.evicted = []
+
+    def run():
+        memory.add_user_message(THEORY_ANSWER)
+        memory.evicted.clear()
+
+    return run
+
+
+def _memory_trim(history: int):
+    from app.services.memory import Memory
+
+    messages = [
+        {"role": "user" if i % 2 else "assistant", "content": THEORY_ANSWER}
+        for i in range(history)
+    ]
+    memory = Memory()
+    memory.stage = "theory"
+
+    def run():
+        memory.history = list(messages)
+        memory.evicted = []
+        memory._trim()
+
+    return run
+
+
+def _sample(level, exclude: int):
+    from app.services.tasks import bank
+
+    rng = random.Random(0)
+    ids = bank.by_level[level] if level is not None else [t["task_id"] for t in bank.page(0, len(bank))]
+    seen = tuple(ids[:exclude])
+    return lambda: bank.sample(level=level, exclude=seen, rng=rng)
+
+
+def _alias():
+    from app.services.tasks import AliasTable
+
+    table = AliasTable(list(range(1000)), [1 + i % 7 for i in range(1000)])
+    rng = random.Random(0)
+    return lambda: table.sample(rng)
+
+
+BENCHMARKS = {
+    "sandbox:level1": lambda: _sandbox_level(1),
+    "sandbox:level2": lambda: _sandbox_level(2),
+    "sandbox:level3": lambda: _sandbox_level(3),
+    "handoff:json": lambda: _handoff("json"),
+    "handoff:json_repair": lambda: _handoff("json_repair"),
+    "handoff:legacy": lambda: _handoff("legacy"),
+    "handoff:legacy_prose": lambda: _handoff("legacy_prose"),
+    "handoff:hint": lambda: _handoff("hint"),
+    "handoff:theory": lambda: _handoff("theory"),
+    "build_system_prompt:all": _prompts,
+    "memory:add": lambda: _memory_add(200),
+    "memory:trim_100": lambda: _memory_trim(100),
+    "memory:trim_1000": lambda: _memory_trim(1000),
+    "memory:trim_10000": lambda: _memory_trim(10_000),
+    "sample:any": lambda: _sample(None, 0),
+    "sample:level2": lambda: _sample(2, 0),
+    "sample:level2_seen3": lambda: _sample(2, 3),
+    "sample:alias_1000": _alias,
+}
+
+
+def load_baselines() -> dict:
+    try:
+        with open(BASELINES_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих путей")
+    parser.add_argument("--filter", default="", help="подстрока в имени бенчмарка")
+    parser.add_argument("--min-time", type=float, default=0.2, help="минимальная длительность повтора, сек")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1.5, help="допустимое замедление относительно baseline")
+    parser.add_argument("--json", action="store_true", help="вывести результаты одной JSON-строкой")
+    parser.add_argument("--check", action="store_true", help="код возврата 1 при регрессии")
+    parser.add_argument("--update", action="store_true", help="записать результаты в baselines.json")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        result = measure(factory(), args.min_time, args.repeat)
+        base = baselines.get(name)
+        if base:
+            result["baseline_ns"] = base
+            result["ratio"] = round(result["ns_per_op"] / base, 3)
+            result["regression"] = result["ratio"] > args.tolerance
+        results[name] = result
+        if not args.json:
+            ratio = f"{result['ratio']:>6.2f}x" if "ratio" in result else "      -"
+            mark = "  REGRESSION" if result.get("regression") else ""
+            print(
+                f"{name:<30} {result['ns_per_op']:>14,} ns  median {result['median_ns']:>14,} ns  "
+                f"{ratio}{mark}",
+                flush=True,
+            )
+
+    from app.services.sandbox_pool import pool
+    pool.close()
+
+    if args.json:
+        print(json.dumps({"python": sys.version.split()[0], "results": results}, ensure_ascii=False))
+
+    if args.update:
+        baselines.update({name: r["ns_per_op"] for name, r in results.items()})
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2)
+            f.write("\n")
+
+    if args.check and any(r.get("regression") for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# bench/sandbox_soak.py
+#
+# Soak-тест песочницы: гоняет много запусков подряд и проверяет, что /tmp
+# не растёт — ни файлов, ни занятого места.
+#
+#   cd backend && python -m bench.sandbox_soak --runs 100000
+#
+# Код отправок по кругу: правильное решение, решение с ошибкой, решение,
+# которое пишет файлы в рабочий каталог, и решение, падающее при загрузке.
+# Код возврата 1, если после прогона во временном каталоге остались новые
+# записи или занятое место выросло больше --tolerance-mb.
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.sandbox import run_in_sandbox
+from app.services.sandbox_pool import pool
+
+SUBMISSIONS = [
+    ("def reverse(s):\n    return s[::-1]\n", "reverse_string"),
+    ("def sum_array(a):\n    return sum(a) + 1\n", "sum_array"),
+    (
+        "import os\n"
+        "with open('scratch.txt', 'w') as f:\n"
+        "    f.write('x' * 65536)\n"
+        "os.makedirs('nested/dir', exist_ok=True)\n"
+        "def is_palindrome(s):\n"
+        "    return s == s[::-1]\n",
+        "is_palindrome",
+    ),
+    ("raise RuntimeError('broken on import')\n", "count_vowels"),
+]
+
+
+def snapshot(path: str):
+    """-> (записи во временном каталоге, занятые байты на его разделе)"""
+    return set(os.listdir(path)), shutil.disk_usage(path).used
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-тест песочницы")
+    parser.add_argument("--runs", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--report-every", type=int, default=5_000)
+    parser.add_argument("--tolerance-mb", type=float, default=16.0)
+    args = parser.parse_args()
+
+    tmp = tempfile.gettempdir()
+    pool.start()
+    # прогрев: zygote и импорты не должны попасть в замер
+    run_in_sandbox(*SUBMISSIONS[0], profile=False)
+
+    entries_before, used_before = snapshot(tmp)
+    started = time.monotonic()
+    done = 0
+
+    def submit(i):
+        code, task_id = SUBMISSIONS[i % len(SUBMISSIONS)]
+        return run_in_sandbox(code, task_id, profile=False)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for _ in executor.map(submit, range(args.runs)):
+            done += 1
+            if done % args.report_every == 0 or done == args.runs:
+                entries, used = snapshot(tmp)
+                elapsed = time.monotonic() - started
+                print(
+                    f"{done:>8} runs  {done / elapsed:7.1f} runs/s  "
+                    f"tmp entries {len(entries - entries_before):+d}  "
+                    f"disk {(used - used_before) / 2**20:+.2f} MiB",
+                    flush=True,
+                )
+
+    pool.close()
+    entries_after, used_after = snapshot(tmp)
+    leaked = sorted(entries_after - entries_before)
+    growth_mb = (used_after - used_before) / 2**20
+
+    print(f"leaked entries: {len(leaked)}  disk growth: {growth_mb:+.2f} MiB")
+    for name in leaked[:20]:
+        print(f"  {os.path.join(tmp, name)}")
+    if leaked or growth_mb > args.tolerance_mb:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench/solutions.py
+#
+# Правильные решения задач банка — для нагрузочного прогона и бенчмарков.
+
+SOLUTIONS = {
+    "reverse_string": "def reverse(s):\n    return s[::-1]\n",
+    "sum_array": "def sum_array(a):\n    return sum(a)\n",
+    "is_palindrome": "def is_palindrome(s):\n    return s == s[::-1]\n",
+    "count_vowels": "def count_vowels(s):\n    return sum(ch in 'aeiou' for ch in s)\n",
+    "max_of_three": "def max_of_three(a, b, c):\n    return max(a, b, c)\n",
+    "validate_parentheses": (
+        "def is_valid(s):\n"
+        "    pairs = {')': '(', ']': '[', '}': '{'}\n"
+        "    stack = []\n"
+        "    for ch in s:\n"
+        "        if ch in pairs:\n"
+        "            if not stack or stack.pop() != pairs[ch]:\n"
+        "                return False\n"
+        "        else:\n"
+        "            stack.append(ch)\n"
+        "    return not stack\n"
+    ),
+    "two_sum": (
+        "def two_sum(nums, target):\n"
+        "    seen = {}\n"
+        "    for i, x in enumerate(nums):\n"
+        "        if target - x in seen:\n"
+        "            return [seen[target - x], i]\n"
+        "        seen[x] = i\n"
+    ),
+    "remove_duplicates": "def remove_duplicates(arr):\n    return sorted(set(arr))\n",
+    "rotate_array": (
+        "def rotate(arr, k):\n"
+        "    if not arr:\n"
+        "        return arr\n"
+        "    k %= len(arr)\n"
+        "    return arr[-k:] + arr[:-k]\n"
+    ),
+    "longest_common_prefix": (
+        "def lcp(arr):\n"
+        "    if not arr:\n"
+        "        return ''\n"
+        "    lo, hi = min(arr), max(arr)\n"
+        "    i = 0\n"
+        "    while i < len(lo) and lo[i] == hi[i]:\n"
+        "        i += 1\n"
+        "    return lo[:i]\n"
+    ),
+    "flatten_list": (
+        "def flatten(arr):\n"
+        "    out = []\n"
+        "    for x in arr:\n"
+        "        out.extend(flatten(x) if isinstance(x, list) else [x])\n"
+        "    return out\n"
+    ),
+    "max_subarray": (
+        "def max_subarray(arr):\n"
+        "    best = cur = arr[0]\n"
+        "    for x in arr[1:]:\n"
+        "        cur = max(x, cur + x)\n"
+        "        best = max(best, cur)\n"
+        "    return best\n"
+    ),
+    "top_k": (
+        "from collections import Counter\n"
+        "def top_k(nums, k):\n"
+        "    return [x for x, _ in Counter(nums).most_common(k)]\n"
+    ),
+    "merge_intervals": (
+        "def merge(intervals):\n"
+        "    out = []\n"
+        "    for a, b in sorted(intervals):\n"
+        "        if out and a <= out[-1][1]:\n"
+        "            out[-1][1] = max(out[-1][1], b)\n"
+        "        else:\n"
+        "            out.append([a, b])\n"
+        "    return out\n"
+    ),
+}
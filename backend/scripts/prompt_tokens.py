@@ -0,0 +1,40 @@
+# scripts/prompt_tokens.py
+#
+# Размер скомпилированных системных промптов в токенах.
+#
+#   cd backend && python -m scripts.prompt_tokens
+#
+# Для каждой пары (режим, стадия) печатает символы, токены и сколько
+# токенов приходится на общий префикс режима (его переиспользует
+# prefix/KV-кэш бэкенда).
+
+import os
+
+from app.core import tokens
+from app.core.prompts import PROMPTS
+
+
+def common_prefix(texts: list) -> str:
+    prefix = os.path.commonprefix(texts)
+    # не резать посреди строки — кэш всё равно работает по токенам
+    return prefix[: prefix.rfind("\n") + 1]
+
+
+def main():
+    by_mode = {}
+    for (mode, stage), text in PROMPTS.items():
+        by_mode.setdefault(mode, []).append((stage, text))
+
+    print(f"tokenizer: {tokens.backend()}")
+    print(f"{'mode':<11} {'stage':<17} {'chars':>6} {'tokens':>7} {'prefix':>7}")
+    for mode, items in by_mode.items():
+        prefix_tokens = tokens.count_tokens(common_prefix([text for _, text in items]))
+        for stage, text in items:
+            print(
+                f"{mode:<11} {str(stage or '*'):<17} {len(text):>6} "
+                f"{tokens.count_tokens(text):>7} {prefix_tokens:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
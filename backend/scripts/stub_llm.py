@@ -0,0 +1,183 @@
+# scripts/stub_llm.py
+#
+# Локальная заглушка OpenAI-совместимого API для нагрузочных тестов без
+# обращения к настоящей модели.
+#
+#   cd backend && python -m scripts.stub_llm --port 9999 --latency lognormal:400,0.5 --tokens-per-sec 60
+#   API_KEY=stub LLM_BASE_URL=http://127.0.0.1:9999/ uvicorn app.main:app
+#
+# Задержка до первого токена берётся из распределения --latency:
+#   fixed:MS | uniform:LO,HI | exp:MEAN | lognormal:MEDIAN,SIGMA  (всё в мс)
+# дальше текст отдаётся со скоростью --tokens-per-sec (0 — сразу целиком).
+# --error-rate — доля запросов, на которые отвечаем 503.
+#
+# Ответы подбираются по содержимому запроса так, чтобы бэкенд проходил все
+# стадии: вопросы теории, оценки ответов, подсказки при упавших тестах,
+# передача следующей задачи в формате app/services/handoff.py и конспект.
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.tasks import bank
+
+app = FastAPI(title="Stub LLM")
+
+config = {
+    "latency": ("lognormal", 400.0, 0.5),
+    "tokens_per_sec": 60.0,
+    "error_rate": 0.0,
+}
+
+THEORY_QUESTIONS = [
+    "Хорошо. Чем отличается list от tuple и когда что использовать?",
+    "Понял. Как работает GIL и как он влияет на многопоточность?",
+    "Верно. Что такое генераторы и чем они полезны?",
+    "Хорошо. Как устроен словарь в Python и какова сложность операций?",
+    "Понял. Чем asyncio отличается от потоков?",
+    "Правильно. Что такое декоратор и как написать свой?",
+]
+
+HINTS = [
+    "Может, стоит проверить граничные случаи — пустой вход и один элемент?",
+    "Может, посмотреть, что функция возвращает в последней ветке?",
+    "Подумай, не изменяется ли входной массив по ходу работы.",
+]
+
+GRADES = [
+    {"score": 2, "strength": "уверенно знает основы", "gap": None},
+    {"score": 1, "strength": "понимает идею", "gap": "не хватает примеров"},
+    {"score": 0, "strength": None, "gap": "путается в терминах"},
+]
+
+INTROS = [
+    "Здесь пригодится словарь: подумайте, как обойтись одним проходом по данным.",
+    "Задача на аккуратную работу с граничными случаями — начните с пустого ввода.",
+    "Обратите внимание на сложность: наивное решение здесь квадратичное.",
+]
+
+
+SUMMARY = "- уровень выбран\n- теория: ответы средние\n- кодинг: задача в процессе"
+
+
+def parse_latency(spec: str):
+    kind, _, params = spec.partition(":")
+    values = tuple(float(v) for v in params.split(",") if v)
+    if kind not in ("fixed", "uniform", "exp", "lognormal"):
+        raise argparse.ArgumentTypeError(f"unknown latency distribution: {kind}")
+    return (kind,) + values
+
+
+def sample_latency() -> float:
+    """Задержка до первого токена, сек"""
+    kind, *params = config["latency"]
+    if kind == "fixed":
+        ms = params[0]
+    elif kind == "uniform":
+        ms = random.uniform(params[0], params[1])
+    elif kind == "exp":
+        ms = random.expovariate(1.0 / params[0])
+    else:
+        ms = random.lognormvariate(0.0, params[1]) * params[0]
+    return ms / 1000.0
+
+
+def next_task_answer(prompt: str) -> str:
+    seen = set()
+    match = re.search(r"не повторяй их: ([^\n]*)\.", prompt)
+    if match:
+        seen = {tid.strip() for tid in match.group(1).split(",")}
+    tid = bank.sample(exclude=seen)
+    return json.dumps({"task_id": tid}) + "\nОтлично, все тесты пройдены! Следующая задача."
+
+
+def make_answer(messages: list) -> str:
+    system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+    last = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+
+    if system.startswith("Ты ведёшь краткий конспект"):
+        return SUMMARY
+    if system.startswith("Ты оцениваешь ответ кандидата"):
+        return json.dumps(random.choice(GRADES), ensure_ascii=False)
+    if system.startswith("Ты технический интервьюер. Кратко"):
+        return random.choice(INTROS)
+    if "результаты выполнения кода" in last:
+        if "✗" in last:
+            return '{"task_id": null}\n' + random.choice(HINTS)
+        return next_task_answer(last)
+    return random.choice(THEORY_QUESTIONS)
+
+
+def split_tokens(text: str) -> list:
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def usage(messages: list, pieces: list) -> dict:
+    prompt = sum(len(m.get("content") or "") for m in messages) // 3
+    return {"prompt_tokens": prompt, "completion_tokens": len(pieces), "total_tokens": prompt + len(pieces)}
+
+
+@app.post("/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if random.random() < config["error_rate"]:
+        return JSONResponse({"error": {"message": "stub overloaded"}}, status_code=503)
+
+    messages = body.get("messages", [])
+    text = make_answer(messages)
+    pieces = split_tokens(text)
+    base = {"id": f"stub-{time.monotonic_ns()}", "created": int(time.time()), "model": body.get("model", "stub")}
+    delay = 1.0 / config["tokens_per_sec"] if config["tokens_per_sec"] > 0 else 0.0
+
+    await asyncio.sleep(sample_latency())
+
+    if not body.get("stream"):
+        await asyncio.sleep(delay * len(pieces))
+        return {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(messages, pieces),
+        }
+
+    async def events():
+        for piece in pieces:
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            if delay:
+                await asyncio.sleep(delay)
+        final = {**base, "object": "chat.completion.chunk",
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(final)}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            tail = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage(messages, pieces)}
+            yield f"data: {json.dumps(tail)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка OpenAI-совместимого LLM API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--latency", type=parse_latency, default=config["latency"])
+    parser.add_argument("--tokens-per-sec", type=float, default=config["tokens_per_sec"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    args = parser.parse_args()
+
+    config.update(latency=args.latency, tokens_per_sec=args.tokens_per_sec, error_rate=args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
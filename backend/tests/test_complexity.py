@@ -0,0 +1,58 @@
+# Подбор класса сложности по замерам
+
+import pytest
+
+from app.services.complexity import fit_complexity, slower_than
+from app.services.sandbox import profile_solution
+from app.services.tasks import get_task
+
+SIZES = [64 << i for i in range(12)]
+
+# Замеры хеш-решения two_sum (мс): наклон log-log 1.05 из-за кэшей и роста
+# словаря, по ошибке МНК ближе O(n log n)
+LINEAR_WITH_CACHE_MISSES = [
+    0.0089, 0.0178, 0.0402, 0.0812, 0.1636, 0.3268,
+    0.7062, 1.5054, 3.2775, 6.575, 13.4735, 26.5757,
+]
+
+TWO_SUM_LINEAR = (
+    "def two_sum(nums, target):\n"
+    "    seen = {}\n"
+    "    for i, x in enumerate(nums):\n"
+    "        if target - x in seen:\n"
+    "            return [seen[target - x], i]\n"
+    "        seen[x] = i\n"
+)
+TWO_SUM_QUADRATIC = (
+    "def two_sum(nums, target):\n"
+    "    for i in range(len(nums)):\n"
+    "        for j in range(i + 1, len(nums)):\n"
+    "            if nums[i] + nums[j] == target:\n"
+    "                return [i, j]\n"
+)
+
+
+def test_linear_with_cache_misses_is_linear():
+    fit = fit_complexity(SIZES, [t / 1000 for t in LINEAR_WITH_CACHE_MISSES])
+    assert fit["class"] == "O(n)"
+
+
+@pytest.mark.parametrize("power, expected", [(1, "O(n)"), (2, "O(n²)"), (3, "O(n³)")])
+def test_synthetic_powers(power, expected):
+    times = [1e-7 * n ** power + 1e-5 for n in SIZES[:8]]
+    assert fit_complexity(SIZES[:8], times)["class"] == expected
+
+
+@pytest.mark.parametrize("code, expected", [
+    (TWO_SUM_LINEAR, "O(n)"),
+    (TWO_SUM_QUADRATIC, "O(n²)"),
+])
+def test_profile_two_sum(code, expected):
+    spec = get_task("two_sum")["profile"]
+    assert profile_solution(code, spec)["class"] == expected
+
+
+def test_slower_than():
+    assert slower_than("O(n²)", "O(n)")
+    assert not slower_than("O(n)", "O(n log n)")
+    assert not slower_than("O(n)", "O(n)")
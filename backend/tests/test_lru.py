@@ -0,0 +1,35 @@
+# LRUCache: вытеснение по размеру и TTL
+
+from app.core.lru import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_fixed_ttl_expires_entries_that_were_read():
+    clock = Clock()
+    cache = LRUCache(10, ttl=10, sliding=False, clock=clock)
+    cache.set("old", 1)
+    clock.now = 5
+    cache.set("new", 2)
+    cache.get("old")  # чтение не продлевает запись
+    clock.now = 11
+    assert cache.expire() == 1
+    assert "old" not in cache and "new" in cache
+
+
+def test_sliding_ttl_keeps_recently_read():
+    clock = Clock()
+    cache = LRUCache(2, ttl=10, clock=clock)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    clock.now = 8
+    cache.get(1)
+    cache.set(3, "c")  # вытесняется давно не читанная 2
+    clock.now = 15
+    assert cache.get(1) == "a" and 2 not in cache and cache.get(3) == "c"
@@ -0,0 +1,52 @@
+# Песочница: ожидаемые значения тестов не должны быть доступны коду кандидата
+
+import pytest
+
+from app.services.sandbox import run_in_sandbox
+from app.services.sandbox_pool import pool
+
+# Решение, которое ищет ожидаемые ответы по стеку вызовов и среди всех
+# живых объектов процесса и возвращает их вместо вычисления
+FRAME_WALK = '''
+import gc
+import sys
+
+def _leaked():
+    frame = sys._getframe()
+    while frame is not None:
+        for scope in (frame.f_locals, frame.f_globals):
+            for name, value in list(scope.items()):
+                if "expected" in name.lower() and isinstance(value, list):
+                    return value
+                if isinstance(value, dict) and isinstance(value.get("expected"), list):
+                    return value["expected"]
+        frame = frame.f_back
+    for obj in gc.get_objects():
+        if isinstance(obj, dict) and isinstance(obj.get("expected"), list):
+            return obj["expected"]
+        if type(obj).__name__ == "FailFast":
+            return obj.expected
+    return None
+
+CALLS = []
+
+def sum_array(arr):
+    leaked = _leaked()
+    CALLS.append(arr)
+    return leaked[len(CALLS) - 1] if leaked else None
+'''
+
+
+@pytest.fixture(params=[True, False], ids=["pool", "spawn"])
+def runner(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(pool, "size", 0)
+    yield
+    pool.close()
+
+
+@pytest.mark.parametrize("fail_fast", [False, True])
+def test_frame_walk_does_not_see_expected(runner, fail_fast):
+    result = run_in_sandbox(FRAME_WALK, "sum_array", fail_fast=fail_fast, profile=False)
+    assert not result["success"]
+    assert not any(t["status"] == "passed" for t in result["tests"])
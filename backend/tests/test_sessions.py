@@ -0,0 +1,62 @@
+# Сессии в SQLite, общей для нескольких воркеров
+
+import time
+
+import pytest
+
+from app.services.memory import SessionStore
+from app.services.session_backend import CONFLICTS, SQLiteSessionBackend
+
+
+@pytest.fixture
+def workers(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    backends = [SQLiteSessionBackend(path, flush_interval=0.01) for _ in range(2)]
+    yield [SessionStore(backend=backend) for backend in backends]
+    for backend in backends:
+        backend.close()
+
+
+def _conflicts() -> float:
+    return CONFLICTS._series.get((), 0)
+
+
+def _flush():
+    time.sleep(0.1)
+
+
+def test_other_worker_sees_saved_turn(workers):
+    a, b = workers
+    memory = a.get("s")
+    memory.stage = "theory"
+    a.save("s", memory)
+    _flush()
+    assert b.get("s").stage == "theory"
+
+    memory = b.get("s")
+    memory.stage = "coding"
+    b.save("s", memory)
+    _flush()
+    assert a.get("s").stage == "coding"
+
+
+def test_concurrent_turns_do_not_overwrite_each_other(workers):
+    a, b = workers
+    memory = a.get("s")
+    a.save("s", memory)
+    _flush()
+
+    # оба воркера начали ход с одной версии
+    first, second = a.get("s"), b.get("s")
+    first.stage = "theory"
+    second.stage = "coding"
+    conflicts = _conflicts()
+    a.save("s", first)
+    _flush()
+    b.save("s", second)
+    _flush()
+
+    assert _conflicts() == conflicts + 1
+    assert a.get("s").stage == "theory"
+    # проигравший воркер перечитал состояние победителя
+    assert b.get("s").stage == "theory"
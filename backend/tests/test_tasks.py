@@ -0,0 +1,32 @@
+# Взвешенный выбор задач
+
+import random
+from collections import Counter
+
+import pytest
+
+from app.services.tasks import AliasTable
+
+
+def test_weights_are_respected():
+    table = AliasTable(["a", "b"], [3, 1])
+    rng = random.Random(0)
+    counts = Counter(table.sample(rng) for _ in range(20000))
+    assert 0.72 < counts["a"] / 20000 < 0.78
+
+
+def test_zero_weight_is_never_sampled():
+    table = AliasTable(["a", "b"], [1, 0])
+    rng = random.Random(0)
+    assert {table.sample(rng) for _ in range(1000)} == {"a"}
+
+
+def test_all_zero_weights_are_uniform():
+    table = AliasTable(["a", "b", "c"], [0, 0, 0])
+    rng = random.Random(0)
+    assert {table.sample(rng) for _ in range(1000)} == {"a", "b", "c"}
+
+
+def test_negative_weight_is_rejected():
+    with pytest.raises(ValueError):
+        AliasTable(["a"], [-1])